@@ -0,0 +1,73 @@
+"""
+チェックポイントからの再開の確認とベンチマーク
+
+    python bench_checkpoints.py [--years N] [--interval K] [--repeat R]
+
+同じ開始状態・シード・意思決定で N 年進めた後、年数を延ばして（N + 25 年）もう一度実行し、
+チェックポイントから再開した結果が最初から計算した結果と一致すること、計算を省いた年数が 0 より
+大きいことを確認する。あわせて再開あり・なしの時間を比較する。
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import pandas as pd
+
+from config import DEFAULT_PARAMS, rcp_climate_params
+from sim_params import SimParams
+from result_cache import ResultCache
+from simulation import iter_sequential_years
+from checkpoint_cache import iter_sequential_from_checkpoints
+
+INITIAL_VALUES = {
+    'temp': 15.0, 'precip': 1700.0, 'municipal_demand': 100.0, 'available_water': 1000.0,
+    'crop_yield': 4000.0, 'hot_days': 30.0, 'extreme_precip_freq': 0.1, 'ecosystem_level': 100.0,
+    'forest_area': 5000.0,
+}
+DECISION_VARS = pd.DataFrame([{
+    'planting_trees_amount': 100, 'house_migration_amount': 50, 'dam_levee_construction_cost': 1,
+    'paddy_dam_construction_cost': 5, 'capacity_building_cost': 3, 'transportation_invest': 1,
+    'agricultural_RnD_cost': 3,
+}])
+SEED = 42
+
+
+def run(params, num_years, cache=None, interval=5):
+    kwargs = dict(start_year=params.start_year, num_years=num_years, initial_values=INITIAL_VALUES,
+                  decision_vars_list=DECISION_VARS, params=params, seed=SEED)
+    if cache is None:
+        return 0, list(iter_sequential_years(**kwargs))
+    skipped, outputs = iter_sequential_from_checkpoints(cache=cache, interval=interval, **kwargs)
+    return skipped, list(outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=25)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    params = SimParams.from_dict({**DEFAULT_PARAMS, **rcp_climate_params[4.5]})
+    extended = args.years + 25
+
+    cache = ResultCache(32 * 1024 * 1024, 600)
+    run(params, args.years, cache, args.interval)
+    skipped, resumed = run(params, extended, cache, args.interval)
+    _, full = run(params, extended)
+    assert skipped > 0, "no years were skipped"
+    assert pd.DataFrame(resumed).equals(pd.DataFrame(full)), "resumed run differs from the full run"
+    print(f"resumed {extended} years from a checkpoint: skipped {skipped}, results identical")
+
+    for name, use_cache in [("from scratch", False), ("resumed", True)]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run(params, extended, cache if use_cache else None, args.interval)
+        per_run = (time.perf_counter() - start) / args.repeat
+        print(f"{name:>12}: {per_run * 1e3:8.2f} ms / run")
+
+
+if __name__ == "__main__":
+    main()
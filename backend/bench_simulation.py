@@ -0,0 +1,107 @@
+"""
+simulate_year のマイクロベンチマーク
+
+    python bench_simulation.py [--years N] [--repeat R]
+
+SimState を使い回す現在の simulate_year と、変更前の simulate_year（状態を辞書で受け取り、
+毎年 出力と次年の状態の辞書を作り直して convert_numpy で再帰変換する）とで、1年あたりの時間を比較する。
+変更前の simulate_year は実行時に git から読み出し（--baseline-rev、既定は BASELINE_REV）、
+パラメータの辞書と同じ forcing を渡す。git の履歴がある作業ツリーで実行すること。
+計算式は同じなので、差は状態の受け渡し方（とパラメータを辞書で引くか SimParams の属性で引くか）だけになる
+（最初に両者の出力が一致することも確かめる）。
+"""
+import sys
+import time
+import types
+import argparse
+import subprocess
+from dataclasses import fields
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent / "src"))
+
+import numpy as np
+
+from config import DEFAULT_PARAMS, rcp_climate_params
+from sim_params import SimParams
+from climate_forcing import build_climate_forcing, forcing_at
+from sim_state import SimState
+from simulation import simulate_year
+
+INITIAL_VALUES = {
+    'temp': 15.0, 'precip': 1700.0, 'municipal_demand': 100.0, 'available_water': 1000.0,
+    'crop_yield': 4000.0, 'hot_days': 30.0, 'extreme_precip_freq': 0.1, 'ecosystem_level': 100.0,
+    'forest_area': 5000.0, 'planting_history': {},
+}
+DECISION_VARS = {
+    'planting_trees_amount': 100, 'house_migration_amount': 50, 'dam_levee_construction_cost': 1,
+    'paddy_dam_construction_cost': 5, 'capacity_building_cost': 3, 'transportation_invest': 1,
+    'agricultural_RnD_cost': 3,
+}
+
+
+# 変更前の simulate_year の版（SimState を導入したコミットの親）
+BASELINE_REV = "5306b93^"
+
+
+def load_baseline_simulation(rev):
+    """rev の src/simulation.py を git から読み出し、一時的なモジュールとして読み込む"""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:./src/simulation.py"],
+        cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+    ).stdout
+    module = types.ModuleType("simulation_baseline")
+    module.__file__ = f"<{rev}:backend/src/simulation.py>"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+
+def run_slotted(years, params, forcing):
+    state = SimState.from_values(INITIAL_VALUES, params, int(years[0]))
+    results = []
+    for t, year in enumerate(years):
+        state, outputs = simulate_year(year, state, DECISION_VARS, params, forcing_at(forcing, t))
+        results.append(outputs)
+    return results
+
+
+def run_dict_handoff(years, params_dict, forcing, simulate_year_dict):
+    # 変更前の simulate_simulation のループ
+    prev_values = INITIAL_VALUES.copy()
+    results = []
+    for t, year in enumerate(years):
+        prev_values, outputs = simulate_year_dict(year, prev_values, DECISION_VARS, params_dict, forcing_at(forcing, t))
+        results.append(outputs)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, default=75)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--baseline-rev", default=BASELINE_REV, help="変更前の simulate_year を読み出す git の版")
+    args = parser.parse_args()
+
+    params = SimParams.from_dict({**DEFAULT_PARAMS, **rcp_climate_params[4.5]})
+    years = np.arange(params.start_year, params.start_year + args.years)
+    params_dict = {f.name: getattr(params, f.name) for f in fields(SimParams)}
+    forcing = build_climate_forcing(years, params, 1, [np.random.default_rng(0)])
+    baseline = load_baseline_simulation(args.baseline_rev)
+
+    def run_baseline(years, params_dict, forcing):
+        return run_dict_handoff(years, params_dict, forcing, baseline.simulate_year)
+
+    slotted, handoff = run_slotted(years, params, forcing), run_baseline(years, params_dict, forcing)
+    for new, old in zip(slotted, handoff):
+        assert all(np.allclose(new[key], old[key]) for key in old), "the two kernels disagree"
+
+    for name, fn, fn_params in [("slotted state", run_slotted, params), ("dict handoff", run_baseline, params_dict)]:
+        fn(years, fn_params, forcing)  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn(years, fn_params, forcing)
+        per_year = (time.perf_counter() - start) / (args.repeat * len(years))
+        print(f"{name:>14}: {per_year * 1e6:8.2f} µs / year")
+
+
+if __name__ == "__main__":
+    main()
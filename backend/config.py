@@ -13,6 +13,43 @@ DATA_DIR.mkdir(exist_ok=True)
 RANK_FILE = DATA_DIR / "block_scores.tsv"
 ACTION_LOG_FILE = DATA_DIR / "decision_log.csv"
 YOUR_NAME_FILE = DATA_DIR / "your_name.csv"
+# 评分的主存储（SQLite）；block_scores.tsv 在需要时从这里导出
+SCORE_DB_FILE = DATA_DIR / "block_scores.sqlite3"
+# uvicorn worker进程数（run.py --workers 会设置该变量）；大于1时会话与情景结果放在磁盘上由各worker共享
+# 注意：预测结果缓存、检查点缓存与请求合并（RequestCoalescer）在每个worker中各自独立，不在worker间共享
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+
+# 多worker时各情景的仿真结果（每个情景一个文件）；超过文件数上限时删除最旧的
+SCENARIO_STORE_DIR = DATA_DIR / "scenarios"
+SCENARIO_STORE_MAX_FILES = int(os.getenv("SCENARIO_STORE_MAX_FILES", 1000))
+
+# 蒙特卡洛进程池：应用启动时创建一次，所有请求共用（Railway 8vCPU 上限6个进程，由各worker平分）
+MC_POOL_WORKERS = int(os.getenv("MC_POOL_WORKERS", max(1, min(6, os.cpu_count() or 1) // WEB_CONCURRENCY)))
+# 汇总（summary）模式下每一波同时计算的仿真数，内存占用与 num_simulations 无关
+MC_WAVE_SIZE = int(os.getenv("MC_WAVE_SIZE", 256))
+
+# 预测（Predict）结果缓存：容量上限（字节）与有效期（秒）
+PREDICT_CACHE_MAX_BYTES = int(os.getenv("PREDICT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+PREDICT_CACHE_TTL_SECONDS = float(os.getenv("PREDICT_CACHE_TTL_SECONDS", 600))
+# 带种子的Sequential运行（/simulate/sequential 与会话）的检查点缓存：每隔多少年保存一次仿真状态，以及容量上限（字节）
+CHECKPOINT_INTERVAL_YEARS = int(os.getenv("CHECKPOINT_INTERVAL_YEARS", 5))
+CHECKPOINT_CACHE_MAX_BYTES = int(os.getenv("CHECKPOINT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+# Sequential模式的服务端会话：闲置多少秒后从内存中移除；设置快照目录时移除前（及关闭时）先保存到磁盘
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", 1800))
+SESSION_SNAPSHOT_DIR = Path(os.getenv("SESSION_SNAPSHOT_DIR")) if os.getenv("SESSION_SNAPSHOT_DIR") else None
+# 多worker时会话始终保存在磁盘上（未设置快照目录时使用 data/sessions）
+if WEB_CONCURRENCY > 1 and SESSION_SNAPSHOT_DIR is None:
+    SESSION_SNAPSHOT_DIR = DATA_DIR / "sessions"
+
+# 决策日志只追加新行；后台每隔多少秒整理一次（按时间排序、去除写入中断的行），0 表示不整理
+DECISION_LOG_COMPACT_SECONDS = float(os.getenv("DECISION_LOG_COMPACT_SECONDS", 300))
+
+# 后台写入队列：按文件累积待写数据，达到条数上限或间隔时间后批量写入（请求中不再做磁盘I/O）
+PERSIST_FLUSH_INTERVAL_SECONDS = float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", 0.5))
+PERSIST_MAX_BATCH = int(os.getenv("PERSIST_MAX_BATCH", 256))
+# fsync策略：none（交给操作系统）/ batch（每批写入后一次）/ always（每条写入后）
+PERSIST_FSYNC = os.getenv("PERSIST_FSYNC", "none")
 
 start_year = 2026
 end_year = 2100
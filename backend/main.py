@@ -2,59 +2,174 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent / "src"))
 
-from fastapi import FastAPI, HTTPException, WebSocket, Depends
+from fastapi import FastAPI, HTTPException, WebSocket, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 import pandas as pd
 import numpy as np
 import json
 import zipfile
 from datetime import datetime
-from typing import Dict
-
-from config import DEFAULT_PARAMS, rcp_climate_params, RANK_FILE, ACTION_LOG_FILE, YOUR_NAME_FILE
+from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from functools import partial
+
+from config import (
+    DEFAULT_PARAMS, rcp_climate_params, RANK_FILE, ACTION_LOG_FILE, YOUR_NAME_FILE, MC_POOL_WORKERS, MC_WAVE_SIZE,
+    PREDICT_CACHE_MAX_BYTES, PREDICT_CACHE_TTL_SECONDS, CHECKPOINT_INTERVAL_YEARS, CHECKPOINT_CACHE_MAX_BYTES,
+    SESSION_IDLE_SECONDS, SESSION_SNAPSHOT_DIR, DECISION_LOG_COMPACT_SECONDS,
+    SCORE_DB_FILE, PERSIST_FLUSH_INTERVAL_SECONDS, PERSIST_MAX_BATCH, PERSIST_FSYNC,
+    SCENARIO_STORE_DIR, SCENARIO_STORE_MAX_FILES, WEB_CONCURRENCY
+)
 from models import (
     SimulationRequest, SimulationResponse, CompareRequest, CompareResponse,
-    DecisionVar, CurrentValues, BlockRaw
+    DecisionVar, CurrentValues, BlockRaw,
+    PredictEnsembleRequest, PredictEnsembleResponse, PredictEnsemble,
+    SessionOpenRequest, SessionAdvanceRequest, SessionResponse
+)
+from sim_params import compile_rcp_params
+from simulation import simulate_simulation, spawn_rngs, iter_sequential_years
+from simulation_batch import simulate_simulation_batch
+from result_block import allocate_result_block
+from simulation_pool import start_pool, shutdown_pool, run_monte_carlo, iter_monte_carlo
+from ensemble_stats import EnsembleStats, ConvergenceMonitor
+from result_block import OUTPUT_FIELDS, ResultBlock
+from result_cache import ResultCache, canonical_key
+from checkpoint_cache import iter_sequential_from_checkpoints
+from request_coalescer import RequestCoalescer, RequestSuperseded
+from session_store import SessionStore, SharedSessionStore, SessionConflict
+from append_log import AppendOnlyCsvLog, CompactionThread
+from score_store import ScoreStore
+from leaderboard import Leaderboard
+from write_behind import WriteBehindQueue, append_text_sink, csv_log_sink
+from file_lock import file_lock, atomic_replace
+from scenario_store import ScenarioStore
+from sim_state import SimState
+from utils import calculate_scenario_indicators, aggregate_blocks, BLOCKS
+
+# 各RCP的参数在启动时只构建一次，之后作为只读对象共享
+# None 对应 DEFAULT_PARAMS 本身（未指定RCP、未知RCP值、预测模式）
+COMPILED_PARAMS = compile_rcp_params(DEFAULT_PARAMS, rcp_climate_params)
+
+# 预测结果的进程内LRU缓存（键为规范化请求的sha256）
+predict_cache = ResultCache(PREDICT_CACHE_MAX_BYTES, PREDICT_CACHE_TTL_SECONDS)
+# 带种子运行的中间状态（检查点），决策只在后面年份不同的请求可从检查点继续计算
+checkpoint_cache = ResultCache(CHECKPOINT_CACHE_MAX_BYTES, PREDICT_CACHE_TTL_SECONDS)
+# 按 (user_name, scenario_name) 合并预测请求：取消过时请求，相同请求只计算一次
+predict_coalescer = RequestCoalescer()
+# Sequential模式的服务端会话（按 (user_name, scenario_name) 保存最新状态与轨迹）
+# 多worker时会话放在磁盘上，任何worker都能继续同一个会话
+if WEB_CONCURRENCY > 1:
+    session_store = SharedSessionStore(SESSION_IDLE_SECONDS, SESSION_SNAPSHOT_DIR)
+else:
+    session_store = SessionStore(SESSION_IDLE_SECONDS, SESSION_SNAPSHOT_DIR)
+# 决策日志：每次只追加新行，不再读取并重写整个文件
+decision_log = AppendOnlyCsvLog(ACTION_LOG_FILE)
+# 评分库（SQLite，按 (user_name, scenario_name, period) 建索引）；首次启动时导入已有的 block_scores.tsv
+score_store = ScoreStore(SCORE_DB_FILE)
+if score_store.count() == 0 and RANK_FILE.exists():
+    imported = score_store.import_tsv(RANK_FILE)
+    if imported:
+        print(f"📥 [Scores] 已从 block_scores.tsv 导入 {imported} 条评分")
+# 排行榜：每次写入评分时增量更新，启动时从评分库重建
+leaderboard = Leaderboard()
+leaderboard.rebuild(score_store.rows())
+_leaderboard_version = score_store.data_version()
+
+def _refresh_leaderboard():
+    """其他worker写入评分后（评分库的 data_version 变化），从评分库重建排行榜；单worker时不会发生"""
+    global _leaderboard_version
+    version = score_store.data_version()
+    if version != _leaderboard_version:
+        persist_queue.flush("scores")
+        leaderboard.rebuild(score_store.rows())
+        _leaderboard_version = version
+
+USER_LOG_PATH = Path(__file__).parent / "data" / "user_log.jsonl"
+RESULTS_NAME_FILE = Path(__file__).parent / "data" / "your_name.csv"
+
+def _write_user_name(path):
+    """用户名文件只保留最后一个用户名"""
+    def write(user_names):
+        df = pd.DataFrame([{"user_name": user_names[-1]}])
+        with file_lock(path):
+            atomic_replace(path, lambda f: df.to_csv(f, index=False))
+    return write
+
+def _run_in_order(operations):
+    for operation in operations:
+        operation()
+
+# 后台写入队列：请求只负责入队，由后台线程按文件批量写入；关闭时写完剩余数据
+persist_queue = WriteBehindQueue(
+    PERSIST_FLUSH_INTERVAL_SECONDS, PERSIST_MAX_BATCH,
+    on_error=lambda key, e: print(f"❌ [Persist] 写入失败 {key}: {e}")
 )
-from simulation import simulate_simulation
-from utils import calculate_scenario_indicators, aggregate_blocks
+persist_queue.register(USER_LOG_PATH, append_text_sink(USER_LOG_PATH, PERSIST_FSYNC))
+persist_queue.register(ACTION_LOG_FILE, csv_log_sink(decision_log, PERSIST_FSYNC))
+persist_queue.register(YOUR_NAME_FILE, _write_user_name(YOUR_NAME_FILE))
+persist_queue.register(RESULTS_NAME_FILE, _write_user_name(RESULTS_NAME_FILE))
+# 评分库的写入（SQLite 自身负责持久化），按入队顺序执行
+persist_queue.register("scores", _run_in_order)
 
 def _save_results_data(user_name: str, scenario_name: str, block_scores: list):
-    """保存结果数据到文件"""
-    import pandas as pd
-    from pathlib import Path
-
-    data_dir = Path(__file__).parent / "data"
-    data_dir.mkdir(exist_ok=True)
-
+    """保存结果数据（写入后台写入队列）"""
     # 保存用户名
-    user_name_file = data_dir / "your_name.csv"
-    pd.DataFrame([{"user_name": user_name}]).to_csv(user_name_file, index=False)
+    persist_queue.put(RESULTS_NAME_FILE, user_name)
 
-    # 保存评分数据
+    # 保存评分数据（删除同一用户的旧数据后写入）；排行榜立即更新
     if block_scores:
-        df_scores = pd.DataFrame(block_scores)
-        df_scores['user_name'] = user_name
-        df_scores['scenario_name'] = scenario_name
-        df_scores['timestamp'] = pd.Timestamp.utcnow()
-
-        # 保存到block_scores.tsv
-        block_scores_file = data_dir / "block_scores.tsv"
-        if block_scores_file.exists():
-            # 读取现有数据
-            existing_df = pd.read_csv(block_scores_file, sep='\t')
-            # 删除同一用户的旧数据
-            existing_df = existing_df[existing_df['user_name'] != user_name]
-            # 合并新数据
-            combined_df = pd.concat([existing_df, df_scores], ignore_index=True)
-        else:
-            combined_df = df_scores
-
-        combined_df.to_csv(block_scores_file, sep='\t', index=False)
-
-app = FastAPI()
+        persist_queue.put("scores", partial(
+            score_store.replace_user, user_name, scenario_name, block_scores, pd.Timestamp.utcnow()
+        ))
+        leaderboard.replace_user(user_name, scenario_name, block_scores)
+
+def _append_decision_log(user_name: str, scenario_name: str, decision_rows: list):
+    """把Sequential模式的决策变量（每年一行）追加到决策日志"""
+    df_log = pd.DataFrame(decision_rows)
+    df_log['user_name'] = user_name
+    df_log['scenario_name'] = scenario_name
+    df_log['timestamp'] = pd.Timestamp.utcnow()
+    persist_queue.put(ACTION_LOG_FILE, df_log)
+
+def _merge_sequential_scores(user_name: str, scenario_name: str, block_scores: list):
+    """把Sequential模式的评分合并到评分库，已存在的 (user_name, scenario_name, period) 保留旧值"""
+    # 保存用户名文件
+    persist_queue.put(YOUR_NAME_FILE, user_name)
+    persist_queue.put("scores", partial(
+        score_store.upsert_keep_existing, user_name, scenario_name, block_scores, pd.Timestamp.utcnow()
+    ))
+    leaderboard.upsert(user_name, scenario_name, block_scores, keep_existing=True)
+
+def _sync_data_files():
+    """把写入队列中的数据落盘，评分库有变更时重新导出 block_scores.tsv（供管理员下载与旧的读取方式使用）"""
+    persist_queue.flush()
+    score_store.export_tsv(RANK_FILE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 蒙特卡洛进程池在启动时创建并预热，请求路径上不再有进程启动开销
+    start_pool(MC_POOL_WORKERS)
+    print(f"🚀 [Monte Carlo] 进程池已启动，{MC_POOL_WORKERS} 个worker")
+    persist_queue.start()
+    compaction = None
+    if DECISION_LOG_COMPACT_SECONDS > 0:
+        compaction = CompactionThread(
+            decision_log, DECISION_LOG_COMPACT_SECONDS,
+            on_error=lambda e: print(f"❌ [Decision Log] 整理失败: {e}")
+        )
+        compaction.start()
+    yield
+    if compaction is not None:
+        compaction.stop()
+    # 写完队列中剩余的数据
+    persist_queue.close()
+    shutdown_pool()
+    # 设置了快照目录时，关闭前把内存中的会话保存到磁盘
+    session_store.snapshot_all()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -69,7 +184,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-scenarios_data: Dict[str, pd.DataFrame] = {}
+# 各情景的结果：单worker时放在内存中；多worker时保存在磁盘上由各worker共用
+if WEB_CONCURRENCY > 1:
+    scenarios_data = ScenarioStore(SCENARIO_STORE_DIR, SCENARIO_STORE_MAX_FILES)
+else:
+    scenarios_data: Dict[str, pd.DataFrame] = {}
+
+def _check_scenario_name(scenario_name: str):
+    """多worker时情景名会用作文件名，过长时拒绝请求"""
+    if isinstance(scenarios_data, ScenarioStore):
+        try:
+            ScenarioStore.check_name(scenario_name)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 # 管理员认证
 security = HTTPBasic()
@@ -91,110 +218,182 @@ def authenticate_admin(credentials: HTTPBasicCredentials = Depends(security)):
 def ping():
     return {"message": "pong"}
 
+def _select_params(req: SimulationRequest):
+    """按第一个决策变量的RCP值选取预编译的参数（未指定或未知的RCP值使用默认参数）"""
+    if req.decision_vars and len(req.decision_vars) > 0:
+        return COMPILED_PARAMS.get(req.decision_vars[0].cp_climate_params, COMPILED_PARAMS[None])
+    return COMPILED_PARAMS[None]
+
 @app.post("/simulate", response_model=SimulationResponse)
 def run_simulation(req: SimulationRequest):
     scenario_name = req.scenario_name
     mode = req.mode
+    _check_scenario_name(scenario_name)
+    if req.engine not in ("scalar", "batch"):
+        raise HTTPException(status_code=400, detail=f"Unknown engine: {req.engine}")
+    if req.output not in ("rows", "summary"):
+        raise HTTPException(status_code=400, detail=f"Unknown output: {req.output}")
+    unknown_outputs = [name for name in req.convergence_outputs if name not in OUTPUT_FIELDS]
+    if req.target_ci_width is not None and unknown_outputs:
+        raise HTTPException(status_code=400, detail=f"Unknown convergence outputs: {unknown_outputs}")
     decision_df = pd.DataFrame([dv.model_dump() for dv in req.decision_vars]) if req.decision_vars else pd.DataFrame()
 
-    # Update params based on RCP scenario and current values
-    params = DEFAULT_PARAMS.copy()
-    if req.decision_vars and len(req.decision_vars) > 0:
-        rcp_param = rcp_climate_params.get(req.decision_vars[0].cp_climate_params, {})
-        params.update(rcp_param)
+    params = _select_params(req)
 
     all_df = pd.DataFrame()
     block_scores = []
+    summary = None
+    convergence = None
+
+    if mode == "Monte Carlo Simulation Mode" and req.target_ci_width is not None:
+        # 自适应蒙特卡洛：num_simulations 为上限，每批仿真后检查置信区间宽度，达到目标即停止
+        batch_size = max(2, req.adaptive_batch_size)
+        print(f"🚀 [Monte Carlo] 自适应计算，最多 {req.num_simulations} 次仿真，每批 {batch_size} 次")
+        monitor = ConvergenceMonitor(params.years, req.target_ci_width, req.convergence_outputs, req.target_rel_ci_width)
+        stats = EnsembleStats(len(params.years)) if req.output == "summary" else None
+        block = allocate_result_block(req.num_simulations, params.years) if stats is None else None
+        chunks = iter_monte_carlo(
+            years=params.years,
+            initial_values=req.current_year_index_seq.model_dump(),
+            decision_vars_list=decision_df,
+            params=params,
+            num_simulations=req.num_simulations,
+            seed=req.seed,
+            max_workers=MC_POOL_WORKERS,
+            engine=req.engine,
+            wave_size=batch_size
+        )
+        converged = False
+        for chunk in chunks:
+            monitor.update(chunk)
+            if stats is not None:
+                stats.update(chunk.data)
+            else:
+                block.data[:, chunk.start:chunk.start + chunk.num_simulations] = chunk.data
+            # 只在一批全部完成时判断，保证结果与种子一致、可复现
+            if monitor.count % batch_size == 0 and monitor.converged():
+                converged = True
+                break
+        chunks.close()
+        converged = converged or monitor.converged()
+        convergence = monitor.report(converged)
+        if stats is not None:
+            summary = stats.summary(params.years)
+        else:
+            all_df = ResultBlock(years=block.years, data=block.data[:, :monitor.count]).to_dataframe()
+        print(f"✅ [Monte Carlo] 自适应计算完成，使用 {monitor.count} 次仿真，收敛: {converged}")
+
+    elif mode == "Monte Carlo Simulation Mode" and req.output == "summary":
+        # 每完成一批仿真就累积到统计量中，不保留原始行
+        print(f"🚀 [Monte Carlo] 汇总模式计算 {req.num_simulations} 次仿真")
+        stats = EnsembleStats(len(params.years))
+        chunks = iter_monte_carlo(
+            years=params.years,
+            initial_values=req.current_year_index_seq.model_dump(),
+            decision_vars_list=decision_df,
+            params=params,
+            num_simulations=req.num_simulations,
+            seed=req.seed,
+            max_workers=MC_POOL_WORKERS,
+            engine=req.engine,
+            wave_size=MC_WAVE_SIZE
+        )
+        for chunk in chunks:
+            stats.update(chunk.data)
+        summary = stats.summary(params.years)
+        print(f"✅ [Monte Carlo] 汇总完成，共 {stats.count} 次仿真")
+
+    elif mode == "Monte Carlo Simulation Mode" and req.engine == "batch":
+        # 全仿真按年向量化推进，单进程即可完成
+        print(f"🚀 [Monte Carlo] batch引擎计算 {req.num_simulations} 次仿真")
+        # 结果直接写入预分配的列式结果块，再零拷贝构建DataFrame
+        block = simulate_simulation_batch(
+            years=params.years,
+            initial_values=req.current_year_index_seq.model_dump(),
+            decision_vars_list=decision_df,
+            params=params,
+            num_simulations=req.num_simulations,
+            rng=spawn_rngs(req.seed, req.num_simulations) if req.seed is not None else None,
+            out=allocate_result_block(req.num_simulations, params.years)
+        )
+        all_df = block.to_dataframe()
+        block_scores = []
+        print(f"✅ [Monte Carlo] batch计算完成，共处理 {len(all_df)} 行数据")
 
-    if mode == "Monte Carlo Simulation Mode":
-        # 并行化蒙特卡洛仿真以充分利用多核CPU
-        from concurrent.futures import ProcessPoolExecutor
-        import multiprocessing
-
-        def single_simulation(sim_index):
-            """单次仿真函数，用于并行执行"""
-            sim_result = simulate_simulation(
-                years=params['years'],
-                initial_values=req.current_year_index_seq.model_dump(),
-                decision_vars_list=decision_df,
-                params=params
-            )
-            df_sim = pd.DataFrame(sim_result)
-            df_sim["Simulation"] = sim_index
-            return df_sim
-
-        # Railway 8vCPU优化：充分利用CPU资源支持15用户并发
-        max_workers = min(6, multiprocessing.cpu_count(), req.num_simulations)
-        print(f"🚀 [Monte Carlo] 使用 {max_workers} 个CPU核心并行计算 {req.num_simulations} 次仿真")
-
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            # 提交所有仿真任务
-            futures = [executor.submit(single_simulation, sim) for sim in range(req.num_simulations)]
-            # 收集结果
-            results = [future.result() for future in futures]
-
-        all_df = pd.concat(results, ignore_index=True)
+    elif mode == "Monte Carlo Simulation Mode":
+        # 使用常驻进程池，按块（chunk）提交仿真任务
+        print(f"🚀 [Monte Carlo] 使用 {MC_POOL_WORKERS} 个worker并行计算 {req.num_simulations} 次仿真")
+        block = run_monte_carlo(
+            years=params.years,
+            initial_values=req.current_year_index_seq.model_dump(),
+            decision_vars_list=decision_df,
+            params=params,
+            num_simulations=req.num_simulations,
+            seed=req.seed,
+            max_workers=MC_POOL_WORKERS
+        )
+        all_df = block.to_dataframe()
         block_scores = []
         print(f"✅ [Monte Carlo] 并行计算完成，共处理 {len(all_df)} 行数据")
 
-        # 清理内存以避免资源过载
-        import gc
-        del results
-        gc.collect()
-
     elif mode == "Sequential Decision-Making Mode":
         sim_years = np.arange(req.decision_vars[0].year, req.decision_vars[0].year + 1)
         result = simulate_simulation(
             years=sim_years,
             initial_values=req.current_year_index_seq.model_dump(),
             decision_vars_list=decision_df,
-            params=params
+            params=params,
+            # 1年ずつ呼ばれるため、年ごとに異なるストリームになるよう年をシードに含める
+            rng=spawn_rngs([req.seed, int(sim_years[0])], 1)[0] if req.seed is not None else None
         )
         all_df = pd.DataFrame(result)
         block_scores = aggregate_blocks(all_df)
 
         # ログ保存
-        df_log = pd.DataFrame([dv.model_dump() for dv in req.decision_vars])
-        df_log['user_name'] = req.user_name
-        df_log['scenario_name'] = scenario_name
-        df_log['timestamp'] = pd.Timestamp.utcnow()
-        if ACTION_LOG_FILE.exists():
-            df_old = pd.read_csv(ACTION_LOG_FILE)
-            df_combined = pd.concat([df_old, df_log], ignore_index=True)
-        else:
-            df_combined = df_log
-        df_combined.to_csv(ACTION_LOG_FILE, index=False)
-
-        df_csv = pd.DataFrame(block_scores)
-        df_csv['user_name'] = req.user_name
-        df_csv['scenario_name'] = scenario_name
-        df_csv['timestamp'] = pd.Timestamp.utcnow()
-        # 保存用户名文件
-        pd.DataFrame([{"user_name": req.user_name}]).to_csv(YOUR_NAME_FILE, index=False)
-        if RANK_FILE.exists():
-            old = pd.read_csv(RANK_FILE, sep='\t')
-            merged = (
-                old.set_index(['user_name', 'scenario_name', 'period'])
-                .combine_first(df_csv.set_index(['user_name', 'scenario_name', 'period']))
-                .reset_index()
-            )
-            merged.to_csv(RANK_FILE, sep='\t', index=False)
-        else:
-            df_csv.to_csv(RANK_FILE, sep='\t', index=False)
+        _append_decision_log(req.user_name, scenario_name, [dv.model_dump() for dv in req.decision_vars])
+        _merge_sequential_scores(req.user_name, scenario_name, block_scores)
 
     
     elif mode == "Predict Simulation Mode":
         # 全期間の予測値を計算する
-        params = DEFAULT_PARAMS.copy()
-        sim_years = np.arange(req.decision_vars[0].year, params['end_year'] + 1)
-        seq_result = simulate_simulation(
-            years=sim_years,
-            initial_values=req.current_year_index_seq.model_dump(),
-            decision_vars_list=decision_df,
-            params=params
-        )
+        params = COMPILED_PARAMS[None]
+        sim_years = np.arange(req.decision_vars[0].year, params.end_year + 1)
+        # 只有第一组决策变量参与计算，预测模式不使用RCP
+        cache_key = canonical_key({
+            "kind": "predict",
+            "initial_values": req.current_year_index_seq.model_dump(),
+            "decision_vars": req.decision_vars[0].model_dump(exclude={"cp_climate_params"}),
+            "seed": req.seed,
+        })
+        # 未指定种子的预测每次都是新的随机结果，只缓存带种子的请求
+        use_cache = req.use_cache and req.seed is not None
+
+        def compute_predict(cancel):
+            cached = predict_cache.get(cache_key) if use_cache else None
+            if cached is not None:
+                return cached
+            seq_result = simulate_simulation(
+                years=sim_years,
+                initial_values=req.current_year_index_seq.model_dump(),
+                decision_vars_list=decision_df,
+                params=params,
+                rng=spawn_rngs(req.seed, 1)[0] if req.seed is not None else None,
+                cancel=cancel
+            )
+            df = pd.DataFrame(seq_result)
+            if use_cache:
+                predict_cache.put(cache_key, df, df.memory_usage(deep=True).sum())
+            return df
 
-        all_df = pd.DataFrame(seq_result)
+        # 同一用户/场景的新预测请求会取消旧请求；同时到达的相同请求共享一次计算
+        try:
+            all_df = predict_coalescer.run(
+                (req.user_name, scenario_name, "predict"),
+                cache_key + (":nocache" if not use_cache else ""),
+                compute_predict
+            )
+        except RequestSuperseded:
+            raise HTTPException(status_code=409, detail="Superseded by a newer prediction request")
         block_scores = []
 
     elif mode == "Record Results Mode":
@@ -232,30 +431,330 @@ def run_simulation(req: SimulationRequest):
     else:
         raise HTTPException(status_code=400, detail=f"Unknown mode: {mode}")
 
-    if mode != "Predict Simulation Mode":
+    # 汇总模式没有原始行，保留之前的场景数据
+    if mode != "Predict Simulation Mode" and summary is None:
         scenarios_data[scenario_name] = all_df.copy()
 
     return SimulationResponse(
         scenario_name=scenario_name,
+        # シミュレーション結果の NumPy 型はここで（to_dict により）Python 標準型に変換される
         data=all_df.to_dict(orient="records"),
-        block_scores=block_scores
+        block_scores=block_scores,
+        summary=summary,
+        convergence=convergence
     )
 
-@app.get("/ranking")
-def get_ranking():
-    if not RANK_FILE.exists():
-        return []
-    df = pd.read_csv(RANK_FILE, sep='\t')
-    latest = df.sort_values('timestamp').drop_duplicates(['user_name', 'scenario_name', 'period'], keep='last')
-    rank_df = (
-        latest.groupby('user_name')['total_score']
-        .mean()
-        .reset_index()
-        .sort_values('total_score', ascending=False)
-        .reset_index(drop=True)
+@app.post("/simulate/predict_ensemble", response_model=PredictEnsembleResponse)
+def predict_ensemble(req: PredictEnsembleRequest):
+    """
+    预测模式的集合版本：一次请求计算所有RCP的所有成员（每个RCP一次向量化计算）
+
+    替代前端逐个发送的多次 Predict Simulation Mode 请求。
+    与 Predict Simulation Mode 不同，这里按 rcp_values 使用对应RCP的参数。
+    """
+    if not req.decision_vars:
+        raise HTTPException(status_code=400, detail="decision_vars is required")
+    if req.output not in ("rows", "summary"):
+        raise HTTPException(status_code=400, detail=f"Unknown output: {req.output}")
+    if req.ensemble_size < 1:
+        raise HTTPException(status_code=400, detail="ensemble_size must be at least 1")
+
+    decision_df = pd.DataFrame([dv.model_dump() for dv in req.decision_vars])
+    initial_values = req.current_year_index_seq.model_dump()
+    rcp_values = req.rcp_values if req.rcp_values else [req.decision_vars[0].cp_climate_params]
+    # 未指定种子时每次都是新的随机成员，只缓存带种子的请求
+    use_cache = req.use_cache and req.seed is not None
+
+    def compute_ensembles(cancel):
+        members = []
+        for rcp in rcp_values:
+            params = COMPILED_PARAMS.get(rcp, COMPILED_PARAMS[None])
+            sim_years = np.arange(req.decision_vars[0].year, params.end_year + 1)
+            cache_key = canonical_key({
+                "kind": "predict_ensemble",
+                "initial_values": initial_values,
+                "decision_vars": req.decision_vars[0].model_dump(exclude={"cp_climate_params"}),
+                "rcp": rcp,
+                "ensemble_size": req.ensemble_size,
+                "seed": req.seed,
+            })
+            block = predict_cache.get(cache_key) if use_cache else None
+            if block is None:
+                block = simulate_simulation_batch(
+                    years=sim_years,
+                    initial_values=initial_values,
+                    decision_vars_list=decision_df,
+                    params=params,
+                    num_simulations=req.ensemble_size,
+                    rng=spawn_rngs(req.seed, req.ensemble_size) if req.seed is not None else None,
+                    out=allocate_result_block(req.ensemble_size, sim_years),
+                    cancel=cancel
+                )
+                if use_cache:
+                    predict_cache.put(cache_key, block, block.data.nbytes)
+            members.append((rcp, block))
+        return members
+
+    # 同一用户/场景的新预测请求会取消旧请求；同时到达的相同请求共享一次计算
+    flight_key = canonical_key({
+        "kind": "predict_ensemble",
+        "initial_values": initial_values,
+        "decision_vars": req.decision_vars[0].model_dump(exclude={"cp_climate_params"}),
+        "rcp_values": rcp_values,
+        "ensemble_size": req.ensemble_size,
+        "seed": req.seed,
+        "use_cache": use_cache,
+    })
+    try:
+        members = predict_coalescer.run((req.user_name, req.scenario_name, "predict_ensemble"), flight_key, compute_ensembles)
+    except RequestSuperseded:
+        raise HTTPException(status_code=409, detail="Superseded by a newer prediction request")
+
+    ensembles = []
+    for rcp, block in members:
+        if req.output == "summary":
+            stats = EnsembleStats(len(block.years))
+            stats.update(block.data)
+            ensembles.append(PredictEnsemble(rcp=rcp, summary=stats.summary(block.years)))
+        else:
+            df = block.to_dataframe()
+            trajectories = [
+                member.drop(columns='Simulation').to_dict(orient="records")
+                for _, member in df.groupby('Simulation', sort=True)
+            ]
+            ensembles.append(PredictEnsemble(rcp=rcp, trajectories=trajectories))
+
+    return PredictEnsembleResponse(scenario_name=req.scenario_name, ensembles=ensembles)
+
+@app.post("/simulate/stream")
+def stream_simulation(req: SimulationRequest, stream_format: str = Query("ndjson", alias="format")):
+    """
+    蒙特卡洛仿真的流式版本：每完成一批仿真就发送一行NDJSON（format=sse 时为一个SSE事件）
+
+    每批: {"start": 首个仿真编号, "count": 仿真数, "data": [与 /simulate 相同格式的行]}
+    结束: {"done": true, "scenario_name": ..., "num_simulations": ...}
+    """
+    if req.mode != "Monte Carlo Simulation Mode":
+        raise HTTPException(status_code=400, detail=f"Streaming is only supported for Monte Carlo Simulation Mode, got: {req.mode}")
+    if req.engine not in ("scalar", "batch"):
+        raise HTTPException(status_code=400, detail=f"Unknown engine: {req.engine}")
+    if stream_format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail=f"Unknown format: {stream_format}")
+    _check_scenario_name(req.scenario_name)
+
+    decision_df = pd.DataFrame([dv.model_dump() for dv in req.decision_vars]) if req.decision_vars else pd.DataFrame()
+    params = _select_params(req)
+
+    def encode(event: str, payload: dict) -> str:
+        line = json.dumps(payload, ensure_ascii=False)
+        return f"event: {event}\ndata: {line}\n\n" if stream_format == "sse" else line + "\n"
+
+    def events():
+        # 完成的批次只以NumPy数组累积（供 /compare 使用），不保留整个集合的Python字典
+        block = allocate_result_block(req.num_simulations, params.years)
+        chunks = iter_monte_carlo(
+            years=params.years,
+            initial_values=req.current_year_index_seq.model_dump(),
+            decision_vars_list=decision_df,
+            params=params,
+            num_simulations=req.num_simulations,
+            seed=req.seed,
+            max_workers=MC_POOL_WORKERS,
+            engine=req.engine,
+            chunks_per_worker=8
+        )
+        for chunk in chunks:
+            block.data[:, chunk.start:chunk.start + chunk.num_simulations] = chunk.data
+            yield encode("chunk", {
+                "start": chunk.start,
+                "count": chunk.num_simulations,
+                "data": chunk.to_dataframe().to_dict(orient="records"),
+            })
+        scenarios_data[req.scenario_name] = block.to_dataframe()
+        print(f"✅ [Monte Carlo] 流式计算完成，共 {req.num_simulations} 次仿真")
+        yield encode("done", {"done": True, "scenario_name": req.scenario_name, "num_simulations": req.num_simulations})
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type)
+
+def _sequential_events(user_name: str, scenario_name: str, decision_vars: dict, num_years: int, params, seed=None,
+                       initial_values=None, state=None, commit=None, on_complete=None, use_checkpoints=True):
+    """
+    从 decision_vars["year"] 起逐年推进，每算完一年生成一行NDJSON；全部算完后决策日志与评分只写一次
+
+    带种子时从检查点缓存中相同起点、相同决策的最后一个检查点继续（跳过的年数见结束行的 skipped_years）。
+    commit(rows) 在保存之前调用；抛出 SessionConflict 时不保存，结束行为 {"done": false, "status_code": 409, ...}。
+    on_complete(rows) 在保存之后调用，返回的字典会合并到结束行中。
+    """
+    run = dict(
+        start_year=decision_vars["year"],
+        num_years=num_years,
+        initial_values=initial_values,
+        decision_vars_list=pd.DataFrame([decision_vars]),
+        params=params,
+        seed=seed,
+        state=state
     )
-    rank_df['rank'] = rank_df.index + 1
-    return rank_df.to_dict(orient='records')
+    if seed is not None and use_checkpoints:
+        skipped_years, yearly_outputs = iter_sequential_from_checkpoints(
+            cache=checkpoint_cache, interval=CHECKPOINT_INTERVAL_YEARS, **run
+        )
+    else:
+        skipped_years, yearly_outputs = 0, iter_sequential_years(**run)
+
+    rows = []
+    first_scores = {}
+    for outputs in yearly_outputs:
+        row = {k: v.item() if isinstance(v, np.generic) else v for k, v in outputs.items()}
+        rows.append(row)
+        # 与逐年调用相同：每个期间保留该批次中第一年的评分（之后的年份不会覆盖）
+        for s, e, label in BLOCKS:
+            if s <= row["Year"] <= e and label not in first_scores:
+                first_scores.update({r["period"]: r for r in aggregate_blocks(pd.DataFrame([row]))})
+        yield json.dumps({"year": row["Year"], "row": row}, ensure_ascii=False) + "\n"
+
+    # 与 /simulate 的 block_scores 相同，通过 BlockRaw 转换为Python标准类型
+    block_scores = [BlockRaw(**r).model_dump() for r in first_scores.values()]
+    if commit is not None:
+        try:
+            commit(rows)
+        except SessionConflict as e:
+            print(f"⚠️ [Sequential] {user_name} 的会话已被其他请求推进，结果未保存: {e}")
+            yield json.dumps({"done": False, "status_code": 409, "detail": str(e)}, ensure_ascii=False) + "\n"
+            return
+    if rows:
+        _append_decision_log(user_name, scenario_name, [{**decision_vars, "year": row["Year"]} for row in rows])
+        if block_scores:
+            _merge_sequential_scores(user_name, scenario_name, block_scores)
+        scenarios_data[scenario_name] = pd.DataFrame(rows)
+    print(f"✅ [Sequential] {user_name} 推进 {len(rows)} 年，日志与评分已保存")
+    done = {
+        "done": True, "scenario_name": scenario_name, "num_years": len(rows), "block_scores": block_scores,
+        "skipped_years": skipped_years
+    }
+    if on_complete is not None:
+        done.update(on_complete(rows))
+    yield json.dumps(done, ensure_ascii=False) + "\n"
+
+@app.post("/simulate/sequential")
+def stream_sequential(req: SimulationRequest):
+    """
+    Sequential模式的多年版本：一次请求从 decision_vars[0].year 起推进 num_years 年，每算完一年发送一行NDJSON
+
+    每年: {"year": 年份, "row": 与 /simulate 相同格式的一行}
+    结束: {"done": true, "scenario_name": ..., "num_years": 实际推进的年数, "block_scores": [...], "skipped_years": 从检查点跳过的年数}
+    状态在服务端逐年传递；决策日志与评分文件在全部年份算完后只写一次。
+    """
+    if not req.decision_vars:
+        raise HTTPException(status_code=400, detail="decision_vars is required")
+    if req.num_years < 1:
+        raise HTTPException(status_code=400, detail="num_years must be at least 1")
+    _check_scenario_name(req.scenario_name)
+
+    events = _sequential_events(
+        req.user_name, req.scenario_name, req.decision_vars[0].model_dump(), req.num_years, _select_params(req),
+        seed=req.seed, initial_values=req.current_year_index_seq.model_dump(), use_checkpoints=req.use_cache
+    )
+    return StreamingResponse(events, media_type="application/x-ndjson")
+
+def _session_response(session) -> SessionResponse:
+    return SessionResponse(
+        session_id=session.session_id,
+        user_name=session.user_name,
+        scenario_name=session.scenario_name,
+        next_year=session.next_year,
+        data=session.rows
+    )
+
+@app.post("/sessions", response_model=SessionResponse)
+def open_session(req: SessionOpenRequest):
+    """
+    Sequential模式的服务端会话：保存初始状态，之后只需发送 session_id 与决策变量
+
+    同一 (user_name, scenario_name) 只保留一个会话，重新打开会丢弃旧会话。
+    """
+    _check_scenario_name(req.scenario_name)
+    params = COMPILED_PARAMS[None]
+    state = SimState.from_values(req.current_year_index_seq.model_dump(), params, req.start_year)
+    session = session_store.open(req.user_name, req.scenario_name, state, req.start_year)
+    print(f"🆕 [Session] {req.user_name}/{req.scenario_name} 会话已创建: {session.session_id}")
+    return _session_response(session)
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+def get_session(session_id: str):
+    """会话的当前年份与至今为止的轨迹"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return _session_response(session)
+
+@app.post("/sessions/{session_id}/advance")
+def advance_session(session_id: str, req: SessionAdvanceRequest):
+    """
+    从会话的当前状态推进 num_years 年，流式格式与 /simulate/sequential 相同
+
+    结束行额外包含 session_id 与 next_year。decision_vars.year 必须等于会话的 next_year（防止重复提交）：
+    开始时不一致返回 409；同一年的请求并行计算时，只有先完成的一个会更新会话，
+    其余的结束行为 {"done": false, "status_code": 409, ...}，决策日志与评分也不保存。
+    """
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    if req.num_years < 1:
+        raise HTTPException(status_code=400, detail="num_years must be at least 1")
+    if req.decision_vars.year != session.next_year:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Session is at year {session.next_year}, got decisions for {req.decision_vars.year}"
+        )
+
+    # 在副本上计算，全部年份算完后才更新会话（中途断开时会话保持不变）
+    state = session.state.copy()
+    committed = {}
+
+    def commit(rows):
+        # 在会话的锁内再次确认 next_year，未通过时抛出 SessionConflict
+        committed["session"] = session_store.advance(session_id, state, rows, expected_year=req.decision_vars.year)
+
+    def on_complete(rows):
+        updated = committed.get("session")
+        if updated is None:
+            return {"session_id": session_id, "next_year": None}
+        scenarios_data[updated.scenario_name] = pd.DataFrame(updated.rows)
+        return {"session_id": session_id, "next_year": updated.next_year}
+
+    params = COMPILED_PARAMS.get(req.decision_vars.cp_climate_params, COMPILED_PARAMS[None])
+    events = _sequential_events(
+        session.user_name, session.scenario_name, req.decision_vars.model_dump(), req.num_years, params,
+        seed=req.seed, state=state, commit=commit, on_complete=on_complete
+    )
+    return StreamingResponse(events, media_type="application/x-ndjson")
+
+@app.delete("/sessions/{session_id}")
+def close_session(session_id: str):
+    if not session_store.close(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"message": "Session closed", "session_id": session_id}
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """预测结果缓存与检查点缓存的命中/未命中次数与占用情况"""
+    return {"predict": predict_cache.stats(), "checkpoint": checkpoint_cache.stats(), "sessions": session_store.stats(), "persist": persist_queue.stats()}
+
+@app.get("/ranking")
+def get_ranking(limit: Optional[int] = Query(None, ge=1)):
+    """用户排行榜（按各时期 total_score 的平均值降序）；limit 指定时只返回前 limit 名"""
+    _refresh_leaderboard()
+    return leaderboard.top(limit)
+
+@app.get("/ranking/{user_name}")
+def get_user_rank(user_name: str):
+    """指定用户的名次与平均分"""
+    _refresh_leaderboard()
+    entry = leaderboard.rank_of(user_name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"User not ranked: {user_name}")
+    return entry
 
 @app.post("/compare", response_model=CompareResponse)
 def compare_scenario_data(req: CompareRequest):
@@ -277,11 +776,9 @@ def export_scenario_data(scenario_name: str):
 
 @app.get("/block_scores")
 def get_block_scores():
-    if not RANK_FILE.exists():
-        return []
     try:
-        df = pd.read_csv(RANK_FILE, sep="\t")
-        return df.to_dict(orient="records")
+        persist_queue.flush("scores")
+        return score_store.rows()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -301,6 +798,10 @@ def get_user_data(user_name: str):
             "periods_found": 0
         }
 
+        # 先写入队列中该用户可能尚未落盘的数据
+        persist_queue.flush(ACTION_LOG_FILE)
+        persist_queue.flush("scores")
+
         # 获取决策日志
         if ACTION_LOG_FILE.exists():
             df_log = pd.read_csv(ACTION_LOG_FILE)
@@ -311,27 +812,25 @@ def get_user_data(user_name: str):
                 print(f"✅ [API] 找到决策日志: {len(user_logs)} 条记录")
 
         # 获取评分数据并验证完整性
-        if RANK_FILE.exists():
-            df_scores = pd.read_csv(RANK_FILE, sep='\t')
-            user_scores = df_scores[df_scores['user_name'] == user_name]
-            if not user_scores.empty:
-                # 检查是否有3个时期的数据
-                periods = user_scores['period'].unique()
-                expected_periods = ['2026-2050', '2051-2075', '2076-2100']
-
-                result["periods_found"] = len(periods)
-                result["data_complete"] = len(periods) >= 3
-
-                if result["data_complete"]:
-                    # 按时期排序，确保顺序正确
-                    user_scores_sorted = user_scores.sort_values('period')
-                    result["block_scores_tsv"] = user_scores_sorted.to_csv(sep='\t', index=False)
-                    print(f"✅ [API] 找到完整评分数据: {len(periods)} 个时期")
-                else:
-                    result["block_scores_tsv"] = user_scores.to_csv(sep='\t', index=False)
-                    print(f"⚠️ [API] 评分数据不完整: 只有 {len(periods)} 个时期")
+        user_scores = score_store.to_dataframe(user_name)
+        if not user_scores.empty:
+            # 检查是否有3个时期的数据
+            periods = user_scores['period'].unique()
+            expected_periods = ['2026-2050', '2051-2075', '2076-2100']
+
+            result["periods_found"] = len(periods)
+            result["data_complete"] = len(periods) >= 3
+
+            if result["data_complete"]:
+                # 按时期排序，确保顺序正确
+                user_scores_sorted = user_scores.sort_values('period')
+                result["block_scores_tsv"] = user_scores_sorted.to_csv(sep='\t', index=False)
+                print(f"✅ [API] 找到完整评分数据: {len(periods)} 个时期")
+            else:
+                result["block_scores_tsv"] = user_scores.to_csv(sep='\t', index=False)
+                print(f"⚠️ [API] 评分数据不完整: 只有 {len(periods)} 个时期")
 
-                result["found"] = True
+            result["found"] = True
 
         if not result["found"]:
             print(f"❌ [API] 未找到用户数据: {user_name}")
@@ -351,6 +850,7 @@ def get_user_data(user_name: str):
 @app.get("/debug/file_status")
 def get_file_status():
     """检查所有必需文件的状态"""
+    _sync_data_files()
     from pathlib import Path
 
     data_dir = Path(__file__).parent / "data"
@@ -408,12 +908,10 @@ def get_file_status():
 @app.websocket("/ws/log")
 async def websocket_log_endpoint(websocket: WebSocket):
     await websocket.accept()
-    log_path = Path(__file__).parent / "data" / "user_log.jsonl"
     while True:
         try:
             data = await websocket.receive_text()
-            with open(log_path, "a", encoding="utf-8") as f:
-                f.write(data + "\n")
+            persist_queue.put(USER_LOG_PATH, data + "\n")
         except Exception as e:
             # クライアント切断などでエラーが出たら終了
             break
@@ -427,15 +925,8 @@ async def receive_batch_logs(request: dict):
         if not logs:
             return {"status": "success", "message": "No logs to process"}
 
-        log_path = Path(__file__).parent / "data" / "user_log.jsonl"
-
-        # 确保data目录存在
-        log_path.parent.mkdir(exist_ok=True)
-
-        # 批量写入log数据
-        with open(log_path, "a", encoding="utf-8") as f:
-            for log_entry in logs:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        # 批量写入log数据（后台写入队列）
+        persist_queue.put(USER_LOG_PATH, "".join(json.dumps(log_entry, ensure_ascii=False) + "\n" for log_entry in logs))
 
         print(f"✅ [API] 批量接收 {len(logs)} 条log数据")
         return {
@@ -460,9 +951,6 @@ async def end_experiment(request: dict):
         if not user_name:
             raise HTTPException(status_code=400, detail="User name is required")
 
-        log_path = Path(__file__).parent / "data" / "user_log.jsonl"
-        log_path.parent.mkdir(exist_ok=True)
-
         # 写入结束实验的日志
         end_log = {
             "type": "ExperimentEnd",
@@ -471,12 +959,10 @@ async def end_experiment(request: dict):
             "total_logs": len(logs)
         }
 
-        with open(log_path, "a", encoding="utf-8") as f:
-            # 写入所有用户行为日志
-            for log_entry in logs:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-            # 写入实验结束标记
-            f.write(json.dumps(end_log, ensure_ascii=False) + "\n")
+        # 写入所有用户行为日志与实验结束标记（后台写入队列）
+        persist_queue.put(USER_LOG_PATH, "".join(
+            json.dumps(entry, ensure_ascii=False) + "\n" for entry in [*logs, end_log]
+        ))
 
         print(f"✅ [Experiment End] 用户 {user_name} 实验结束，保存 {len(logs)} 条日志")
 
@@ -495,7 +981,8 @@ async def end_experiment(request: dict):
 async def get_user_logs(user_name: str):
     """获取指定用户的所有日志数据"""
     try:
-        log_path = Path(__file__).parent / "data" / "user_log.jsonl"
+        persist_queue.flush(USER_LOG_PATH)
+        log_path = USER_LOG_PATH
 
         if not log_path.exists():
             return {"logs": [], "message": "No logs found"}
@@ -528,6 +1015,7 @@ async def get_user_logs(user_name: str):
 @app.get("/admin/dashboard")
 async def get_admin_dashboard(admin: str = Depends(authenticate_admin)):
     """获取管理员仪表板数据"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
 
@@ -541,10 +1029,7 @@ async def get_admin_dashboard(admin: str = Depends(authenticate_admin)):
                         user_logs.append(json.loads(line.strip()))
 
         # 读取评分数据
-        block_scores = []
-        if RANK_FILE.exists():
-            df = pd.read_csv(RANK_FILE, sep='\t')
-            block_scores = df.to_dict('records')
+        block_scores = score_store.rows()
 
         # 统计信息
         unique_users = set()
@@ -584,13 +1069,15 @@ async def get_admin_dashboard(admin: str = Depends(authenticate_admin)):
 @app.get("/admin/data-files")
 async def list_data_files(admin: str = Depends(authenticate_admin)):
     """获取data文件夹下所有文件的列表和信息"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
         files_info = []
 
         if data_dir.exists():
             for file_path in data_dir.iterdir():
-                if file_path.is_file():
+                # 跳过多worker用的锁文件
+                if file_path.is_file() and file_path.suffix != ".lock":
                     stat = file_path.stat()
                     files_info.append({
                         "name": file_path.name,
@@ -606,6 +1093,7 @@ async def list_data_files(admin: str = Depends(authenticate_admin)):
 @app.get("/admin/preview-file/{filename}")
 async def preview_file_content(filename: str, admin: str = Depends(authenticate_admin)):
     """ファイル内容をプレビュー用に取得"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
         file_path = data_dir / filename
@@ -738,6 +1226,7 @@ async def preview_file_content(filename: str, admin: str = Depends(authenticate_
 @app.get("/admin/download/file/{filename}")
 async def download_single_file(filename: str, admin: str = Depends(authenticate_admin)):
     """指定されたファイルをダウンロード"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
         file_path = data_dir / filename
@@ -762,6 +1251,7 @@ async def download_single_file(filename: str, admin: str = Depends(authenticate_
 @app.get("/admin/download/all")
 async def download_all_data(admin: str = Depends(authenticate_admin)):
     """下载所有数据的压缩包"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -790,6 +1280,7 @@ async def download_all_data(admin: str = Depends(authenticate_admin)):
 @app.get("/admin/download/logs")
 async def download_user_logs(admin: str = Depends(authenticate_admin)):
     """下载用户日志文件"""
+    persist_queue.flush(USER_LOG_PATH)
     try:
         data_dir = Path(__file__).parent / "data"
         log_file = data_dir / "user_log.jsonl"
@@ -810,6 +1301,7 @@ async def download_user_logs(admin: str = Depends(authenticate_admin)):
 @app.get("/admin/download/scores")
 async def download_scores(admin: str = Depends(authenticate_admin)):
     """下载评分数据文件"""
+    _sync_data_files()
     try:
         if not RANK_FILE.exists():
             raise HTTPException(status_code=404, detail="評価ファイルが存在しません")
@@ -827,6 +1319,7 @@ async def download_scores(admin: str = Depends(authenticate_admin)):
 @app.get("/admin/data-stats")
 async def get_data_stats(admin: str = Depends(authenticate_admin)):
     """获取数据统计信息，用于清空前确认"""
+    _sync_data_files()
     try:
         data_dir = Path(__file__).parent / "data"
 
@@ -851,10 +1344,8 @@ async def get_data_stats(admin: str = Depends(authenticate_admin)):
         block_scores = []
         simulation_periods = set()
 
-        if RANK_FILE.exists():
-            df = pd.read_csv(RANK_FILE, sep='\t')
-            block_scores = df.to_dict('records')
-            simulation_periods = set(df['period'].unique()) if 'period' in df.columns else set()
+        block_scores = score_store.rows()
+        simulation_periods = {score['period'] for score in block_scores}
 
         # 统计决策日志
         decision_logs = []
@@ -940,6 +1431,10 @@ async def clear_all_data(admin: str = Depends(authenticate_admin)):
         cleared_files = []
         errors = []
 
+        # 清空评分库（block_scores.tsv 的表头在下面写入）
+        score_store.clear()
+        leaderboard.clear()
+
         # 清空每个文件的内容
         for file_name, file_path in files_to_clear:
             try:
@@ -947,8 +1442,8 @@ async def clear_all_data(admin: str = Depends(authenticate_admin)):
                     # 获取文件原始大小
                     original_size = file_path.stat().st_size
 
-                    # 清空文件内容但保留文件
-                    with open(file_path, 'w', encoding='utf-8') as f:
+                    # 清空文件内容但保留文件（加文件锁，避免与其他worker的写入交错）
+                    with file_lock(file_path), open(file_path, 'w', encoding='utf-8') as f:
                         # 对于TSV和CSV文件，保留表头
                         if file_name == "block_scores.tsv":
                             f.write("user_name\tscenario_name\tperiod\ttotal_score\ttimestamp\n")
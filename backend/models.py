@@ -24,6 +24,9 @@ class CurrentValues(BaseModel):
     levee_level: Optional[float] = 0.0
     high_temp_tolerance_level: Optional[float] = 0.0
     forest_area: Optional[float] = 0.0
+    # 直近 tree_growup_year 年分の植林量（古い順、最後の要素が前年）。結果の各行の 'planting_ring' をそのまま渡す
+    planting_ring: Optional[List[float]] = None
+    # 旧形式（年 → 植林量）。planting_ring がない場合のみ使用
     planting_history: Optional[Dict[int, float]] = {}
     urban_level: Optional[float] = 0.0
     resident_capacity: Optional[float] = 0.0
@@ -47,6 +50,24 @@ class SimulationRequest(BaseModel):
     mode: str
     decision_vars: List[DecisionVar] = []
     num_simulations: int = 100
+    # Monte Carlo Simulation Mode の計算エンジン: "scalar"（1本ずつ）または "batch"（N本をまとめてベクトル化）
+    engine: str = "scalar"
+    # 乱数シード。指定するとシミュレーションごとに独立したストリームを生成し、結果を再現できる
+    seed: Optional[int] = None
+    # Monte Carlo Simulation Mode の出力: "rows"（全シミュレーションの行）または "summary"（年・項目ごとの平均・分散・分位点の帯）
+    output: str = "rows"
+    # Monte Carlo の適応実行: 指定すると num_simulations は上限となり、adaptive_batch_size 本ずつ追加しながら
+    # 各期間の total_score の 95% 信頼区間の幅（点）がこれ以下になった時点で打ち切る
+    target_ci_width: Optional[float] = None
+    # 適応実行で併せて収束を確認する出力項目（シミュレーションごとの年平均）と、平均に対する信頼区間幅の目標
+    convergence_outputs: List[str] = ["Flood Damage", "Crop Yield"]
+    target_rel_ci_width: float = 0.05
+    adaptive_batch_size: int = 20
+    # False にすると Predict Simulation Mode の結果キャッシュ・/simulate/sequential のチェックポイントを使わずに再計算する
+    # （どちらも seed を指定したときだけ使う。seed なしは毎回新しい乱数で計算する）
+    use_cache: bool = True
+    # /simulate/sequential で1回のリクエストに進める年数
+    num_years: int = 25
     current_year_index_seq: CurrentValues
     # 添加仿真数据字段，用于Record Results Mode
     simulation_data: Optional[List[Dict[str, Any]]] = []
@@ -56,6 +77,58 @@ class SimulationResponse(BaseModel):
     scenario_name: str
     data: List[Dict[str, Any]]
     block_scores: List[BlockRaw]
+    # output="summary" のときの帯（data は空）
+    summary: Optional[Dict[str, Any]] = None
+    # 適応実行のときの使用本数と達成精度
+    convergence: Optional[Dict[str, Any]] = None
+
+class PredictEnsembleRequest(BaseModel):
+    user_name: str
+    scenario_name: str
+    decision_vars: List[DecisionVar]
+    current_year_index_seq: CurrentValues
+    # RCP ごとのメンバー数
+    ensemble_size: int = 10
+    # 計算する RCP。省略時は decision_vars[0].cp_climate_params
+    rcp_values: Optional[List[float]] = None
+    # 指定すると全 RCP で同じ乱数ストリームを使う（RCP 間の比較がペアになる）
+    seed: Optional[int] = None
+    # "rows"（全メンバーの軌跡）または "summary"（年・項目ごとの帯）
+    output: str = "rows"
+    # False にすると結果キャッシュを使わずに再計算する（キャッシュは seed を指定したときだけ使う）
+    use_cache: bool = True
+
+class PredictEnsemble(BaseModel):
+    rcp: float
+    # メンバーごとの軌跡（Predict Simulation Mode の data と同じ形の行のリスト）
+    trajectories: List[List[Dict[str, Any]]] = []
+    summary: Optional[Dict[str, Any]] = None
+
+class PredictEnsembleResponse(BaseModel):
+    scenario_name: str
+    ensembles: List[PredictEnsemble]
+
+class SessionOpenRequest(BaseModel):
+    user_name: str
+    scenario_name: str
+    # 最初に計算する年
+    start_year: int
+    current_year_index_seq: CurrentValues
+
+class SessionAdvanceRequest(BaseModel):
+    # year はセッションの next_year と一致している必要がある
+    decision_vars: DecisionVar
+    num_years: int = 1
+    seed: Optional[int] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
+    user_name: str
+    scenario_name: str
+    # 次に計算する年
+    next_year: int
+    # これまでの結果の行（Sequential Decision-Making Mode の data と同じ形）
+    data: List[Dict[str, Any]]
 
 class CompareRequest(BaseModel):
     scenario_names: List[str]
@@ -1,21 +1,41 @@
 """
 Application Entry Point
+
+    python run.py               # 单进程（开发环境自动reload）
+    python run.py --workers 4   # 多个uvicorn worker进程（不使用reload）
+
+多worker时会话、情景结果、评分与日志文件由各worker共享；
+预测结果缓存、检查点缓存与请求合并则在每个worker中各自独立（命中率随worker数下降）。
 """
+import argparse
 import os
 import uvicorn
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        help="uvicorn worker进程数（默认读取 WEB_CONCURRENCY，未设置时为1）"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
     # Railway会自动设置PORT环境变量
     port = int(os.environ.get("PORT", 8000))
     host = os.environ.get("HOST", "0.0.0.0")
 
-    # 生产环境不使用reload
-    reload = os.environ.get("ENVIRONMENT", "development") == "development"
+    # 生产环境不使用reload；多worker时uvicorn不支持reload
+    reload = os.environ.get("ENVIRONMENT", "development") == "development" and args.workers == 1
+
+    # worker进程继承该环境变量，config.py 据此切换为多进程共享的数据层
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
 
     uvicorn.run(
         "main:app",
         host=host,
         port=port,
         reload=reload,
+        workers=args.workers,
         log_level="info"
     )
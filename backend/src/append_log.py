@@ -0,0 +1,111 @@
+# append_log.py
+#
+# decision_log.csv のような追記型の CSV を、全体を読み直さずに末尾へ追記する。
+# 1回の追記は新しい行だけを書くので、ファイルが大きくなってもコストは一定。
+# ファイル形式は pandas の to_csv(index=False) と同じで、pd.read_csv でそのまま読める。
+#
+# compact() はファイル全体を読み、途中で途切れた行を取り除いて timestamp 順に並べ直し、
+# 一時ファイル経由で置き換える。CompactionThread が一定間隔で、追記があったときだけ実行する。
+# 追記・書き直しは file_lock の中で行うので、複数のワーカープロセスが同じファイルを扱っても混ざらない。
+
+import io
+import os
+import threading
+
+import pandas as pd
+
+from file_lock import file_lock, atomic_replace
+
+
+class AppendOnlyCsvLog:
+    """ヘッダーはファイルを作るときだけ書き、以降は行を追記する CSV ログ"""
+
+    def __init__(self, path, sort_column='timestamp'):
+        self.path = path
+        self.sort_column = sort_column
+        self.dirty = False  # 前回の compact() 以降に追記があったか
+        self._lock = threading.Lock()
+
+    def append(self, df, fsync=False):
+        """df の行を追記する。既存ヘッダーにない列がある場合だけ全体を書き直す。fsync=True なら書いた後に fsync"""
+        if df.empty:
+            return
+        with self._lock, file_lock(self.path):
+            header = self._read_header()
+            if header is None:
+                self._write_block(df.to_csv(index=False), mode='w', fsync=fsync)
+            elif set(df.columns) <= set(header):
+                # 列順は既存ヘッダーに合わせる（ない列は空欄）
+                self._write_block(df.reindex(columns=header).to_csv(index=False, header=False), mode='a', fsync=fsync)
+            else:
+                # 列が増えたときは一度だけ書き直す
+                combined = pd.concat([pd.read_csv(self.path), df], ignore_index=True)
+                self._replace(combined)
+            self.dirty = True
+
+    def compact(self):
+        """途切れた行を除き、sort_column 順に並べ替えて書き直す。書き直したら True"""
+        with self._lock, file_lock(self.path):
+            if not self.dirty or not os.path.exists(self.path):
+                return False
+            df = pd.read_csv(self.path, on_bad_lines='skip')
+            if self.sort_column in df.columns:
+                # 途切れた行は末尾の列（timestamp）が欠ける
+                df = df.dropna(subset=[self.sort_column]).sort_values(self.sort_column, kind='stable')
+            self._replace(df)
+            self.dirty = False
+            return True
+
+    def _read_header(self):
+        """既存ファイルの列名（空のファイル・存在しない場合は None）"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        if not line.strip():
+            return None
+        return pd.read_csv(io.StringIO(line)).columns.tolist()
+
+    def _write_block(self, text, mode, fsync=False):
+        # 行が途中で混ざらないよう、まとめて1回で書き込む
+        if mode == 'a' and not self._ends_with_newline():
+            text = '\n' + text
+        with open(self.path, mode, encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _replace(self, df):
+        atomic_replace(self.path, lambda f: df.to_csv(f, index=False))
+
+
+class CompactionThread(threading.Thread):
+    """interval_seconds ごとに log.compact() を呼ぶデーモンスレッド。例外は on_error(e) に渡して続ける"""
+
+    def __init__(self, log, interval_seconds, on_error=None):
+        super().__init__(name='csv-log-compaction', daemon=True)
+        self.log = log
+        self.interval_seconds = float(interval_seconds)
+        self.on_error = on_error
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.log.compact()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,121 @@
+# checkpoint_cache.py
+#
+# シード付きの Sequential Decision-Making Mode（/simulate/sequential とセッションの advance）の
+# 途中状態（チェックポイント）を一定年数ごとに保存し、開始状態・開始年・シード・パラメータと
+# 意思決定の先頭の年が同じ実行を、一致する最後のチェックポイントから再開する。
+# 同じ開始点から年数を延ばしてやり直す場合や、同じ意思決定を繰り返す場合に先頭の年を計算せずに済む。
+# Sequential の forcing は年ごとに spawn_rngs([seed, 年], 1) で決まり、計算する年数によらないので、
+# 再開しても最初から計算した結果と一致する。
+#
+# チェックポイントには状態と「前のチェックポイントから後の行」だけを持たせる（行全体を毎回
+# 複製しないので、保存量は年数に比例する）。再開するときは先頭から途切れずに残っている
+# チェックポイントの行をつなげる。
+
+import hashlib
+import pickle
+from dataclasses import fields
+
+import numpy as np
+
+from result_cache import canonical_key
+from sim_params import as_sim_params
+from sim_state import SimState
+from simulation import compile_decision_schedule, iter_sequential_years
+
+# チェックポイント1件のサイズ見積もり（状態＋出力1行あたり）
+_STATE_BYTES = 4096
+_ROW_BYTES = 64 * 40
+
+
+def params_fingerprint(params):
+    """SimParams の内容のハッシュ"""
+    return canonical_key({f.name: getattr(params, f.name) for f in fields(params)})
+
+
+def state_fingerprint(state):
+    """SimState の内容のハッシュ"""
+    return hashlib.sha256(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def _checkpoint_keys(seed, state, start_year, params, schedule, interval):
+    """チェックポイントの年数 k（interval の倍数）→ キー。キーは意思決定の先頭 k 年分までを含む"""
+    base = canonical_key({
+        'kind': 'sequential',
+        'seed': seed,
+        'state': state_fingerprint(state),
+        'start_year': int(start_year),
+        'params': params_fingerprint(params),
+    })
+    digest = hashlib.sha256(base.encode('utf-8'))
+    keys = {}
+    for k in range(1, len(schedule) + 1):
+        digest.update(np.ascontiguousarray(schedule[k - 1], dtype=np.float64).tobytes())
+        if k % interval == 0:
+            keys[k] = digest.copy().hexdigest()
+    return keys
+
+
+def _restore_into(state, checkpoint_state):
+    """チェックポイントの状態を state に書き戻す（呼び出し側が持つ state をそのまま進めるため）"""
+    restored = checkpoint_state.copy()
+    for f in fields(SimState):
+        setattr(state, f.name, getattr(restored, f.name))
+
+
+def iter_sequential_from_checkpoints(start_year, num_years, initial_values, decision_vars_list, params, seed, cache,
+                                     interval=5, cancel=None, state=None):
+    """
+    iter_sequential_years(..., seed=seed) と同じ outputs を、チェックポイントを使って計算する。
+
+    Args:
+        seed: iter_sequential_years に渡すシード（None は不可）
+        cache: result_cache.ResultCache。値は (SimState, 前のチェックポイントから後の outputs のタプル)
+        interval: チェックポイントを保存する年数の間隔
+        state: iter_sequential_years と同じ。再開した場合もこの state を進める
+
+    Returns:
+        (skipped_years, outputs のイテレータ)。skipped_years はチェックポイントから再開して計算を省いた年数。
+        省いた年の outputs もイテレータの先頭に含まれる
+    """
+    params = as_sim_params(params)
+    years = np.arange(start_year, min(start_year + num_years, params.end_year + 1))
+    if not len(years):
+        return 0, iter(())
+    if state is None:
+        state = SimState.from_values(initial_values, params, int(years[0]))
+    schedule = compile_decision_schedule(decision_vars_list, years, params)
+    keys = _checkpoint_keys(seed, state, years[0], params, schedule, max(1, int(interval)))
+
+    # 先頭から途切れずに残っているチェックポイントまで再開できる
+    start, restored, segments = 0, None, []
+    for k in sorted(keys):
+        checkpoint = cache.get(keys[k])
+        if checkpoint is None:
+            break
+        start, restored = k, checkpoint[0]
+        segments.append(checkpoint[1])
+    if restored is not None:
+        _restore_into(state, restored)
+
+    def outputs():
+        for segment in segments:
+            yield from segment
+        segment = []
+        remaining = iter_sequential_years(
+            start_year=int(years[0]) + start,
+            num_years=len(years) - start,
+            initial_values=None,
+            decision_vars_list=schedule[start:],
+            params=params,
+            seed=seed,
+            cancel=cancel,
+            state=state
+        )
+        for idx, row in enumerate(remaining, start=start + 1):
+            segment.append(row)
+            if idx in keys:
+                cache.put(keys[idx], (state.copy(), tuple(segment)), _STATE_BYTES + _ROW_BYTES * len(segment))
+                segment = []
+            yield row
+
+    return start, outputs()
@@ -0,0 +1,173 @@
+# climate_forcing.py
+#
+# 気温・降水・高温日数・極端降水などの確率的な入力は年・RCPパラメータ・乱数だけで決まり、
+# 意思決定変数には依存しない。ここでは全年・全シミュレーション分を一度に生成し、
+# simulate_year / simulate_year_batch はそれを読むだけにする。
+# 同じ forcing を異なる意思決定の比較（ペア比較）に再利用できる。
+
+import numpy as np
+
+from sim_params import as_sim_params
+
+
+def _draw_columns(rng, num_years, num_simulations, draw):
+    """draw(random, size) を (years, sims) の配列として引く。
+
+    rng が Generator のリストなら各シミュレーションのストリームから1列ずつ、
+    それ以外（None / 単一の Generator）なら全体を一度に引く。
+    """
+    if isinstance(rng, (list, tuple)):
+        return np.stack([np.asarray(draw(r, num_years)) for r in rng], axis=1)
+    random = np.random if rng is None else rng
+    return np.asarray(draw(random, (num_years, num_simulations)))
+
+
+def build_climate_forcing(years, params, num_simulations, rng=None):
+    """
+    years × sims の確率的入力をまとめて生成する。
+
+    Args:
+        years: 対象年の配列
+        params: SimParams またはパラメータ辞書（RCP 反映済み）
+        num_simulations: シミュレーション本数
+        rng: None（グローバル乱数）、Generator、または spawn_rngs による Generator のリスト
+
+    Returns:
+        配列の辞書。'temp' などは shape (years, sims)、'extreme_precip_freq' は (years,)、
+        極端降水の強度は可変長のため 'rain_event_values' / 'rain_event_offsets'
+        （sample_gumbel_events を参照）、'ecosystem_weights' は (years, sims, 3)。
+    """
+    params = as_sim_params(params)
+    years = np.asarray(years)
+    T, N = len(years), int(num_simulations)
+    if isinstance(rng, (list, tuple)) and len(rng) != N:
+        raise ValueError(f"rng streams ({len(rng)}) must match num_simulations ({N})")
+
+    # トレンド項は実行ごとに1回だけ計算する
+    elapsed = (years - params.start_year).astype(float)
+    temp_mean = params.base_temp + params.temp_trend * elapsed
+    precip_mean = params.base_precip + params.precip_trend * elapsed
+    precip_unc = params.base_precip_uncertainty + params.precip_uncertainty_trend * elapsed
+    extreme_precip_freq = np.maximum(params.base_extreme_precip_freq + params.extreme_precip_freq_trend * elapsed, 0)
+    mu = np.maximum(params.base_mu + params.extreme_precip_intensity_trend * elapsed, 0)
+    beta = np.maximum(params.base_beta + params.extreme_precip_intensity_trend * elapsed, 0)
+
+    # 各ストリームから引く順序は固定（シード再現性のため変更しないこと）
+    forest_flood_reduction_coef = _draw_columns(rng, T, N, lambda r, size: r.uniform(0.4, 2.8, size=size))
+    forest_water_retention_coef = _draw_columns(rng, T, N, lambda r, size: r.uniform(2, 4, size=size))
+    temp_noise = _draw_columns(rng, T, N, lambda r, size: r.normal(0, params.temp_uncertainty, size=size))
+    precip_noise = _draw_columns(rng, T, N, lambda r, size: r.standard_normal(size=size))
+    hot_days_noise = _draw_columns(rng, T, N, lambda r, size: r.normal(0, params.hot_days_uncertainty, size=size))
+    lam = extreme_precip_freq if isinstance(rng, (list, tuple)) else extreme_precip_freq[:, None]
+    extreme_precip_events = _draw_columns(rng, T, N, lambda r, size: r.poisson(lam, size=size))
+    rain_event_values, rain_event_offsets = sample_gumbel_events(rng, extreme_precip_events, mu, beta)
+    municipal_noise = _draw_columns(rng, T, N, lambda r, size: r.normal(0, params.municipal_demand_uncertainty, size=size))
+    RnD_threshold_with_noise = _draw_columns(rng, T, N, lambda r, size: r.normal(
+        params.RnD_investment_threshold * params.RnD_investment_required_years,
+        params.RnD_investment_threshold * 0.1,
+        size=size
+    ))
+    levee_threshold_with_noise = _draw_columns(rng, T, N, lambda r, size: r.normal(
+        params.levee_investment_threshold * params.levee_investment_required_years,
+        params.levee_investment_threshold * 0.1,
+        size=size
+    ))
+    ecosystem_weights = _draw_columns(rng, T, N, lambda r, size: r.dirichlet([1, 1, 1], size=size))
+
+    temp = temp_mean[:, None] + temp_noise
+    precip = np.maximum(precip_mean[:, None] + precip_unc[:, None] * precip_noise, 0)
+    hot_days = np.maximum(
+        params.initial_hot_days + (temp - params.base_temp) * params.temp_to_hot_days_coeff + hot_days_noise, 0
+    )
+
+    return {
+        'years': years,
+        'temp': temp,
+        'precip': precip,
+        'hot_days': hot_days,
+        'extreme_precip_freq': extreme_precip_freq,
+        'extreme_precip_events': extreme_precip_events,
+        'rain_event_values': rain_event_values,
+        'rain_event_offsets': rain_event_offsets,
+        'forest_flood_reduction_coef': forest_flood_reduction_coef,
+        'forest_water_retention_coef': forest_water_retention_coef,
+        'municipal_growth': params.municipal_demand_trend + municipal_noise,
+        'RnD_threshold_with_noise': RnD_threshold_with_noise,
+        'levee_threshold_with_noise': levee_threshold_with_noise,
+        'ecosystem_weights': ecosystem_weights,
+    }
+
+
+def sample_gumbel_events(rng, counts, mu, beta):
+    """
+    極端降水の強度（Gumbel 分布）を years × sims 全体でまとめて逆関数法で引く。
+
+    x = mu - beta * log(-log(U))、U ~ Uniform(0, 1)。
+    scipy.stats.gumbel_r.rvs を年・シミュレーションごとに呼ぶ代わりに一括で生成する。
+
+    Args:
+        rng: None（グローバル乱数）、Generator、または Generator のリスト（シミュレーションごと）
+        counts: 各年・各シミュレーションの事象数 (years, sims)
+        mu, beta: 各年の位置・尺度パラメータ (years,)
+
+    Returns:
+        (values, offsets)。セル c = t * sims + i の事象は values[offsets[c]:offsets[c + 1]]。
+        年が外側のため、ある年の全シミュレーション分は連続した区間になる。
+    """
+    counts = np.asarray(counts)
+    T, N = counts.shape
+    flat_counts = counts.reshape(-1)
+    offsets = np.zeros(T * N + 1, dtype=np.int64)
+    np.cumsum(flat_counts, out=offsets[1:])
+    total = int(offsets[-1])
+
+    cell = np.repeat(np.arange(T * N), flat_counts)
+    if isinstance(rng, (list, tuple)):
+        # 各シミュレーションのストリームからは年の昇順に引く
+        order = np.argsort(cell % N, kind='stable')
+        per_sim = counts.sum(axis=0)
+        u = np.empty(total)
+        u[order] = np.concatenate([r.random(int(c)) for r, c in zip(rng, per_sim)])
+    else:
+        random = np.random if rng is None else rng
+        u = random.random(total)
+    u = np.maximum(u, np.finfo(float).tiny)
+
+    year_idx = cell // N
+    values = mu[year_idx] - beta[year_idx] * np.log(-np.log(u))
+    return values, offsets
+
+
+def forcing_at(forcing, t, sim=0):
+    """1年・1シミュレーション分の forcing をスカラーの辞書として取り出す（simulate_year 用）。"""
+    events = int(forcing['extreme_precip_events'][t, sim])
+    cell = t * forcing['temp'].shape[1] + sim
+    start, stop = forcing['rain_event_offsets'][cell], forcing['rain_event_offsets'][cell + 1]
+    return {
+        'temp': float(forcing['temp'][t, sim]),
+        'precip': float(forcing['precip'][t, sim]),
+        'hot_days': float(forcing['hot_days'][t, sim]),
+        'extreme_precip_freq': float(forcing['extreme_precip_freq'][t]),
+        'extreme_precip_events': events,
+        'rain_events': forcing['rain_event_values'][start:stop],
+        'forest_flood_reduction_coef': float(forcing['forest_flood_reduction_coef'][t, sim]),
+        'forest_water_retention_coef': float(forcing['forest_water_retention_coef'][t, sim]),
+        'municipal_growth': float(forcing['municipal_growth'][t, sim]),
+        'RnD_threshold_with_noise': float(forcing['RnD_threshold_with_noise'][t, sim]),
+        'levee_threshold_with_noise': float(forcing['levee_threshold_with_noise'][t, sim]),
+        'ecosystem_weights': forcing['ecosystem_weights'][t, sim],
+    }
+
+
+def forcing_slice(forcing, t):
+    """1年分・全シミュレーションの forcing（simulate_year_batch 用）。
+
+    'rain_event_offsets' はその年の先頭を 0 とした (sims + 1,) に詰め直す。
+    """
+    N = forcing['temp'].shape[1]
+    ragged = ('years', 'rain_event_values', 'rain_event_offsets')
+    year_slice = {key: value[t] for key, value in forcing.items() if key not in ragged}
+    offsets = forcing['rain_event_offsets'][t * N:(t + 1) * N + 1]
+    year_slice['rain_event_values'] = forcing['rain_event_values'][offsets[0]:offsets[-1]]
+    year_slice['rain_event_offsets'] = offsets - offsets[0]
+    return year_slice
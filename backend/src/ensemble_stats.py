@@ -0,0 +1,185 @@
+# ensemble_stats.py
+#
+# モンテカルロの結果を、シミュレーションが終わるたびに年・項目ごとの統計量へ畳み込む。
+# 平均・分散は Welford 法（チャンク単位では Chan らの併合式）、分位点は P² 法
+# （Jain & Chlamtac, 1985）で推定するため、保持するメモリは num_simulations によらず一定。
+
+import numpy as np
+
+from result_block import OUTPUT_FIELDS
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class EnsembleStats:
+    """
+    (項目, 年) ごとの平均・分散・分位点をオンラインで推定する。
+
+    update には ResultBlock.data と同じ並びの (fields, sims, years) 配列を渡す。
+    """
+
+    def __init__(self, num_years, fields=OUTPUT_FIELDS, quantiles=QUANTILES):
+        self.fields = tuple(fields)
+        self.quantiles = np.asarray(quantiles, dtype=float)
+        cells = len(self.fields) * int(num_years)
+        self.shape = (len(self.fields), int(num_years))
+        self.count = 0
+        self.mean = np.zeros(cells)
+        self.m2 = np.zeros(cells)
+
+        # P² のマーカー（高さ q と位置 n）。shape = (分位点, セル, 5)
+        p = self.quantiles[:, None]
+        self._desired = np.tile(np.array([0.0, 2.0, 4.0, 2.0, 4.0]), (len(p), 1))
+        self._desired[:, 1:4] *= np.hstack([p, p, np.ones_like(p)])
+        self._desired[:, 3] += 2 * p[:, 0]
+        self._increment = np.hstack([np.zeros_like(p), p / 2, p, (1 + p) / 2, np.ones_like(p)])
+        self._q = np.zeros((len(p), cells, 5))
+        self._n = np.tile(np.arange(5.0), (len(p), cells, 1))
+        self._head = []  # 最初の5本はマーカーの初期化用にそのまま持つ
+
+    def update(self, data):
+        """(fields, sims, years) の結果を取り込む"""
+        values = np.asarray(data, dtype=float)
+        values = values.transpose(1, 0, 2).reshape(values.shape[1], -1)  # (sims, cells)
+        if len(values) == 0:
+            return
+
+        # Welford（バッチ同士の併合）
+        batch_count = len(values)
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * batch_count / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * batch_count / total
+
+        for x in values:
+            self._observe(x)
+            self.count += 1
+
+    def _observe(self, x):
+        if self.count < 5:
+            self._head.append(x)
+            if self.count == 4:
+                self._q[:] = np.sort(np.stack(self._head, axis=-1), axis=-1)[None]
+            return
+
+        q, n = self._q, self._n
+        q[..., 0] = np.minimum(q[..., 0], x)
+        q[..., 4] = np.maximum(q[..., 4], x)
+        k = (x >= q[..., 1]).astype(int) + (x >= q[..., 2]) + (x >= q[..., 3])
+        n += np.arange(5) > k[..., None]
+        self._desired += self._increment
+
+        for i in (1, 2, 3):
+            d = self._desired[:, None, i] - n[..., i]
+            move = ((d >= 1) & (n[..., i + 1] - n[..., i] > 1)) | ((d <= -1) & (n[..., i - 1] - n[..., i] < -1))
+            if not move.any():
+                continue
+            d = np.sign(d)
+            qi, qm, qp = q[..., i], q[..., i - 1], q[..., i + 1]
+            ni, nm, np_ = n[..., i], n[..., i - 1], n[..., i + 1]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                # 放物線補間、範囲外なら線形補間
+                parabolic = qi + d / (np_ - nm) * (
+                    (ni - nm + d) * (qp - qi) / (np_ - ni) + (np_ - ni - d) * (qi - qm) / (ni - nm)
+                )
+                linear = np.where(d > 0, qi + (qp - qi) / (np_ - ni), qi - (qm - qi) / (nm - ni))
+            adjusted = np.where((qm < parabolic) & (parabolic < qp), parabolic, linear)
+            q[..., i] = np.where(move, adjusted, qi)
+            n[..., i] = np.where(move, ni + d, ni)
+
+    def variance(self):
+        """不偏分散（2本未満は 0）"""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.m2)
+
+    def quantile_values(self):
+        """(分位点, fields, years) の推定値"""
+        if self.count == 0:
+            return np.zeros((len(self.quantiles), *self.shape))
+        if self.count < 5:
+            head = np.stack(self._head)
+            return np.quantile(head, self.quantiles, axis=0).reshape(len(self.quantiles), *self.shape)
+        return self._q[..., 2].reshape(len(self.quantiles), *self.shape)
+
+    def summary(self, years):
+        """
+        項目ごとの帯の辞書を返す（API レスポンス用）。
+
+        {項目名: {'mean': [...], 'std': [...], 'p5': [...], ..., 'p95': [...]}}、各リストは years の順
+        """
+        mean = self.mean.reshape(self.shape)
+        std = np.sqrt(self.variance()).reshape(self.shape)
+        bands = self.quantile_values()
+        result = {}
+        for k, name in enumerate(self.fields):
+            entry = {'mean': mean[k].tolist(), 'std': std[k].tolist()}
+            for j, p in enumerate(self.quantiles):
+                entry[f"p{round(p * 100):g}"] = bands[j, k].tolist()
+            result[name] = entry
+        return {'Year': [int(y) for y in years], 'count': self.count, 'variables': result}
+
+
+class ConvergenceMonitor:
+    """
+    適応モンテカルロの停止判定。
+
+    シミュレーションごとに aggregate_blocks の total_score（期間ごと）と、
+    指定した出力項目の年平均を記録し、その平均の 95% 信頼区間の幅を目標と比べる。
+    total_score は絶対幅（点）、出力項目は平均に対する相対幅で判定する。
+    """
+
+    Z_95 = 1.96
+
+    def __init__(self, years, target_ci_width, outputs=(), target_rel_ci_width=0.05):
+        self.years = np.asarray(years)
+        self.target_ci_width = float(target_ci_width)
+        self.outputs = tuple(outputs)
+        self.target_rel_ci_width = float(target_rel_ci_width)
+        self.count = 0
+        self._samples = {}  # 名前 → シミュレーションごとの値のリスト（配列）
+
+    def update(self, block):
+        """ResultBlock（チャンク）の各シミュレーションを取り込む"""
+        from utils import block_total_scores
+
+        columns = block.columns()
+        values = {f"total_score {label}": totals for label, totals in block_total_scores(columns, self.years).items()}
+        for name in self.outputs:
+            values[name] = columns[name].mean(axis=1)
+        for name, v in values.items():
+            self._samples.setdefault(name, []).append(np.asarray(v, dtype=float))
+        self.count += block.num_simulations
+
+    def ci_widths(self):
+        """名前 → (平均, 95% 信頼区間の幅)"""
+        widths = {}
+        for name, parts in self._samples.items():
+            v = np.concatenate(parts)
+            se = v.std(ddof=1) / np.sqrt(len(v)) if len(v) > 1 else float('inf')
+            widths[name] = (float(v.mean()), float(2 * self.Z_95 * se))
+        return widths
+
+    def converged(self):
+        if self.count < 2:
+            return False
+        for name, (mean, width) in self.ci_widths().items():
+            if name in self.outputs:
+                if width > self.target_rel_ci_width * abs(mean) and width > 0:
+                    return False
+            elif width > self.target_ci_width:
+                return False
+        return True
+
+    def report(self, converged):
+        """API レスポンス用の達成精度"""
+        return {
+            'num_simulations': self.count,
+            'converged': bool(converged),
+            'target_ci_width': self.target_ci_width,
+            'target_rel_ci_width': self.target_rel_ci_width,
+            'ci': {
+                name: {'mean': mean, 'ci_width': width if np.isfinite(width) else None}
+                for name, (mean, width) in self.ci_widths().items()
+            },
+        }
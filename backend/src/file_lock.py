@@ -0,0 +1,60 @@
+# file_lock.py
+#
+# 複数の uvicorn ワーカー（別プロセス）が同じデータファイルを扱うための道具。
+#   - file_lock(path): path.lock に flock をかける排他ロック。プロセス間でもスレッド間でも効く
+#     （flock は open ごとに別のロックになるので、同じプロセス内の別スレッドどうしも待ち合う）
+#   - atomic_replace(path, write): プロセスごとに別名の一時ファイルへ書き、os.replace で置き換える。
+#     読む側は常に書き換え前か後の完全なファイルを見る
+# fcntl のない環境（Windows）ではプロセス内のロックだけになる。
+
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_local_locks = {}  # fcntl がないときの path → Lock
+_local_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """path の排他ロック（ロック用の path.lock ファイルを作る）"""
+    lock_path = f"{path}.lock"
+    if fcntl is None:
+        with _local_locks_guard:
+            lock = _local_locks.setdefault(os.path.abspath(lock_path), threading.Lock())
+        with lock:
+            yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # close でロックも外れる
+        os.close(fd)
+
+
+def atomic_replace(path, write, binary=False):
+    """write(f) で一時ファイルに書き、path と置き換える。binary=True ならバイナリで開く"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with (os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8', newline='')) as f:
+            write(f)
+        # mkstemp は 0600 で作るので、通常のファイルと同じ権限にそろえる
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,182 @@
+# leaderboard.py
+#
+# /ranking 用のメモリ上のランキング。評価が書き込まれるたびに更新し、リクエストごとに
+# TSV の読み込み・重複除去・group-by を行わずに済ませる。
+#   - (user_name, scenario_name, period) ごとに最新の total_score
+#   - ユーザーごとの平均
+#   - (-平均, user_name) で並べたスキップリスト（幅つき。挿入・削除・順位の取得が期待 O(log n)）
+# 並び順は従来の /ranking と同じ平均の高い順（同点は user_name 順）。起動時に評価ストアから作り直す。
+
+import random
+import threading
+from itertools import islice
+
+_MAX_LEVELS = 32
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, levels):
+        self.key = key
+        self.next = [None] * levels
+        self.width = [1] * levels  # next[level] までに進む最下段の要素数
+
+
+class _RankedSkipList:
+    """
+    キーを昇順に保つスキップリスト。各段のリンクに幅（飛び越す要素数）を持たせ、
+    キーより小さい要素の数（順位）も O(log n) で求める。キーは重複しない前提。
+    """
+
+    def __init__(self, keys=()):
+        self._head = _Node(None, _MAX_LEVELS)
+        self._size = 0
+        self._rng = random.Random()
+        for key in sorted(keys):
+            self.add(key)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+    def add(self, key):
+        chain, steps_at_level = self._find(key)
+        levels = 1
+        while levels < _MAX_LEVELS and self._rng.random() < 0.5:
+            levels += 1
+        node = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            node.next[level] = prev.next[level]
+            prev.next[level] = node
+            node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, _MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._find(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            prev = chain[level]
+            prev.width[level] += node.width[level] - 1
+            prev.next[level] = node.next[level]
+        for level in range(len(node.next), _MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def count_less(self, key):
+        """key より小さい要素の数"""
+        count, node = 0, self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                count += node.width[level]
+                node = node.next[level]
+        return count
+
+    def _find(self, key):
+        """各段で key の直前のノードと、その段で進んだ要素数"""
+        chain = [None] * _MAX_LEVELS
+        steps_at_level = [0] * _MAX_LEVELS
+        node = self._head
+        for level in reversed(range(_MAX_LEVELS)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        return chain, steps_at_level
+
+
+class Leaderboard:
+
+    def __init__(self):
+        self._scores = {}  # user_name → {(scenario_name, period): total_score}
+        self._means = {}   # user_name → 平均
+        self._order = _RankedSkipList()  # (-平均, user_name) の昇順
+        self._lock = threading.Lock()
+
+    def rebuild(self, rows):
+        """評価の行（'user_name', 'scenario_name', 'period', 'total_score' を持つ辞書）から作り直す"""
+        scores = {}
+        for row in rows:
+            if row.get('total_score') is None:
+                continue
+            scores.setdefault(row['user_name'], {})[(row['scenario_name'], row['period'])] = float(row['total_score'])
+        with self._lock:
+            self._scores = scores
+            self._means = {user: sum(s.values()) / len(s) for user, s in scores.items()}
+            self._order = _RankedSkipList((-mean, user) for user, mean in self._means.items())
+
+    def upsert(self, user_name, scenario_name, records, keep_existing=False):
+        """
+        aggregate_blocks の評価を反映する。keep_existing=True なら既にある期間は変えない
+        （評価ストアの upsert_keep_existing と同じ）。
+        """
+        with self._lock:
+            scores = self._scores.setdefault(user_name, {})
+            for record in records:
+                key = (scenario_name, record['period'])
+                if record.get('total_score') is None or (keep_existing and key in scores):
+                    continue
+                scores[key] = float(record['total_score'])
+            self._refresh(user_name)
+
+    def replace_user(self, user_name, scenario_name, records):
+        """そのユーザーの評価（全シナリオ）を records で置き換える（評価ストアの replace_user と同じ）"""
+        with self._lock:
+            self._scores[user_name] = {
+                (scenario_name, r['period']): float(r['total_score'])
+                for r in records if r.get('total_score') is not None
+            }
+            self._refresh(user_name)
+
+    def clear(self):
+        with self._lock:
+            self._scores.clear()
+            self._means.clear()
+            self._order = _RankedSkipList()
+
+    def top(self, k=None):
+        """上位 k 人（None なら全員）。[{'user_name', 'total_score', 'rank'}, ...]"""
+        with self._lock:
+            entries = self._order if k is None else islice(self._order, max(0, int(k)))
+            return [
+                {'user_name': user, 'total_score': -neg_mean, 'rank': rank}
+                for rank, (neg_mean, user) in enumerate(entries, start=1)
+            ]
+
+    def rank_of(self, user_name):
+        """ユーザーの順位と平均。ランキングにいなければ None"""
+        with self._lock:
+            mean = self._means.get(user_name)
+            if mean is None:
+                return None
+            rank = self._order.count_less((-mean, user_name)) + 1
+            return {'user_name': user_name, 'total_score': mean, 'rank': rank, 'num_users': len(self._order)}
+
+    def __len__(self):
+        return len(self._order)
+
+    def _refresh(self, user_name):
+        """ユーザーの平均を計算し直し、ソート済みリストの位置を入れ替える"""
+        old = self._means.pop(user_name, None)
+        if old is not None:
+            self._order.remove((-old, user_name))
+        scores = self._scores.get(user_name)
+        if not scores:
+            self._scores.pop(user_name, None)
+            return
+        mean = sum(scores.values()) / len(scores)
+        self._means[user_name] = mean
+        self._order.add((-mean, user_name))
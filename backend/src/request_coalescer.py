@@ -0,0 +1,105 @@
+# request_coalescer.py
+#
+# スライダー操作で同じ (user_name, scenario_name) から連続して届く予測リクエストをまとめる。
+#   - 新しいリクエストが来たら、同じスロットの古いリクエストは待ち行列中でも計算中でも打ち切る
+#     （カーネルが年ごとに cancel() を確認する協調的キャンセル）
+#   - 同時に処理中の同一リクエスト（同じキー）は1回の計算を共有する（single-flight）
+
+import threading
+
+from simulation import SimulationCancelled
+
+
+class RequestSuperseded(Exception):
+    """同じスロットの新しいリクエストに置き換えられた"""
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = []  # この計算を待っている (slot, generation)
+
+
+class RequestCoalescer:
+
+    def __init__(self, poll_seconds=0.05):
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._generation = {}  # slot → 最新リクエストの世代
+        self._active = {}      # slot → 処理中のリクエスト数（0 になったらスロットごと消す）
+        self._flights = {}     # key → 計算中の _Flight
+
+    def _is_stale(self, waiter):
+        slot, generation = waiter
+        return self._generation.get(slot) != generation
+
+    def run(self, slot, key, compute):
+        """
+        compute(cancel) を実行して結果を返す。cancel() が True を返したら compute は
+        simulation.SimulationCancelled を送出して中断する。
+
+        同じ key の計算が進行中ならその結果を待って共有する。待っている全員が新しいリクエストに
+        置き換えられた時点で計算を打ち切る。このリクエスト自身が置き換えられた場合は RequestSuperseded。
+        """
+        with self._lock:
+            generation = self._generation.get(slot, 0) + 1
+            self._generation[slot] = generation
+            self._active[slot] = self._active.get(slot, 0) + 1
+        try:
+            return self._run(slot, generation, key, compute)
+        finally:
+            with self._lock:
+                # 処理中のリクエストが残っていなければ、古い世代を参照する待ち手もいないので消してよい
+                self._active[slot] -= 1
+                if not self._active[slot]:
+                    del self._active[slot]
+                    del self._generation[slot]
+
+    def _run(self, slot, generation, key, compute):
+        me = (slot, generation)
+        while True:
+            with self._lock:
+                if self._is_stale(me):
+                    raise RequestSuperseded()
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _Flight()
+                    self._flights[key] = flight
+                flight.waiters.append(me)
+
+            if leader:
+                self._compute(key, flight, compute)
+            else:
+                while not flight.done.wait(self.poll_seconds):
+                    if self._is_stale(me):
+                        with self._lock:
+                            if me in flight.waiters:
+                                flight.waiters.remove(me)
+                        raise RequestSuperseded()
+
+            if isinstance(flight.error, RequestSuperseded):
+                # 他の待ち手が全員置き換えられて打ち切られた計算。自分が最新ならやり直す
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+    def _compute(self, key, flight, compute):
+        def cancel():
+            return all(self._is_stale(waiter) for waiter in list(flight.waiters))
+
+        try:
+            flight.result = compute(cancel)
+        except SimulationCancelled:
+            flight.error = RequestSuperseded()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
@@ -0,0 +1,83 @@
+# result_block.py
+#
+# モンテカルロの結果を列指向（struct of arrays）で保持する。
+# 1シミュレーションごとに DataFrame を作って pd.concat する代わりに、
+# (出力項目, シミュレーション, 年) の float64 配列を最初に1つだけ確保し、各カーネルはそこへ直接書き込む。
+# Simulation / Year は配列の添字そのものなので保持しない。
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# simulate_year の outputs のうち数値の項目（'Year' と 'planting_ring' 以外）、同じ順序
+OUTPUT_FIELDS = (
+    'Temperature (℃)',
+    'Precipitation (mm)',
+    'Available Water',
+    'Crop Yield',
+    'Municipal Demand',
+    'Flood Damage',
+    'Levee Level',
+    'High Temp Tolerance Level',
+    'Hot Days',
+    'Extreme Precip Frequency',
+    'Extreme Precip Events',
+    'Ecosystem Level',
+    'Municipal Cost',
+    'Urban Level',
+    'Resident Burden',
+    'Levee investment total',
+    'RnD investment total',
+    'Resident capacity',
+    'Forest Area',
+    'risky_house_total',
+    'non_risky_house_total',
+    'transportation_level',
+    'paddy_dam_area',
+    'planting_trees_amount',
+    'house_migration_amount',
+    'dam_levee_construction_cost',
+    'paddy_dam_construction_cost',
+    'capacity_building_cost',
+    'agricultural_RnD_cost',
+    'transportation_invest',
+)
+
+
+@dataclass(slots=True)
+class ResultBlock:
+    years: np.ndarray
+    data: np.ndarray  # (len(OUTPUT_FIELDS), sims, years)
+    start: int = 0    # data の先頭シミュレーションの番号（チャンク単位で返すとき）
+
+    @property
+    def num_simulations(self):
+        return self.data.shape[1]
+
+    def columns(self):
+        """項目名 → (sims, years) の配列（data のビュー）の辞書"""
+        return {name: self.data[k] for k, name in enumerate(OUTPUT_FIELDS)}
+
+    def write_year(self, t, outputs, sim=slice(None)):
+        """simulate_year / simulate_year_batch の outputs を t 年目の列に書き込む"""
+        for k, name in enumerate(OUTPUT_FIELDS):
+            self.data[k, sim, t] = outputs[name]
+
+    def to_dataframe(self):
+        """
+        simulate_simulation の結果を Simulation 列付きで連結したものと同じ並び
+        （Simulation 昇順、各シミュレーション内は Year 昇順）の DataFrame を返す。
+
+        数値列は data をコピーせずにそのまま参照する。'planting_ring' 列は含まない。
+        """
+        num_fields, num_simulations, num_years = self.data.shape
+        df = pd.DataFrame(self.data.reshape(num_fields, -1).T, columns=list(OUTPUT_FIELDS), copy=False)
+        df.insert(0, 'Year', np.tile(self.years, num_simulations))
+        df['Simulation'] = np.repeat(np.arange(self.start, self.start + num_simulations), num_years)
+        return df
+
+
+def allocate_result_block(num_simulations, years):
+    years = np.asarray(years)
+    return ResultBlock(years=years, data=np.empty((len(OUTPUT_FIELDS), int(num_simulations), len(years))))
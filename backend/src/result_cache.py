@@ -0,0 +1,91 @@
+# result_cache.py
+#
+# 予測（Predict）結果のプロセス内キャッシュ。スライダーを戻したときなど、同じ入力の再計算を
+# ハッシュの参照だけで済ませる。容量はバイト数の上限、鮮度は TTL で管理する LRU。
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def canonical_key(payload):
+    """
+    正規化したリクエスト（辞書）の sha256。キーの順序・整数と浮動小数の表記ゆれに依存しない。
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return [normalize(v) for v in value]
+        if isinstance(value, (bool, np.bool_)) or value is None or isinstance(value, str):
+            return value
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return float(value) + 0.0  # -0.0 も 0.0 にそろえる
+        return str(value)
+
+    text = json.dumps(normalize(payload), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """バイト数上限と TTL を持つスレッドセーフな LRU キャッシュ"""
+
+    def __init__(self, max_bytes, ttl_seconds):
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key → (value, nbytes, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """値を返す。ないか期限切れなら None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """値を入れ、上限を超えた分だけ古いものから追い出す。上限より大きい値は入れない"""
+        nbytes = int(nbytes)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, time.monotonic() + self.ttl_seconds)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+            }
+
+    def _remove(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
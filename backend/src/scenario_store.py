@@ -0,0 +1,111 @@
+# scenario_store.py
+#
+# シナリオ名 → 結果の DataFrame の置き場所（従来のモジュール変数 scenarios_data の代わり）。
+# 1シナリオ1ファイル（pickle）でディスクに置くので、複数のワーカープロセスで共有できる
+# （ワーカーが1つのときは使わず、従来どおりメモリ上の辞書を使う）。
+# 書き込みは atomic_replace で置き換えるだけなので、読む側は常に完全な DataFrame を読む。
+# 読み出しはファイルの更新時刻が変わっていなければプロセス内のキャッシュを使う。
+# シナリオ名はファイル名になるので長さを制限し（check_name）、ファイル数が max_files を超えたら
+# 古いものから消す。
+#
+# 辞書と同じ書き方（store[name] = df, store[name], name in store, keys(), clear()）で使える。
+
+import os
+import threading
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from file_lock import atomic_replace
+
+_SUFFIX = '.pkl'
+# エスケープ後のシナリオ名の上限（多くのファイルシステムのファイル名の上限は 255 バイト）
+MAX_NAME_BYTES = 200
+
+
+class ScenarioStore:
+
+    def __init__(self, directory, max_files=None):
+        self.directory = str(directory)
+        self.max_files = max_files
+        self._cache = {}  # name → (mtime_ns, DataFrame)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def check_name(name):
+        """ファイル名に使えない長さのシナリオ名なら ValueError"""
+        if len(quote(name, safe='')) > MAX_NAME_BYTES:
+            raise ValueError(f"scenario_name is too long (max {MAX_NAME_BYTES} bytes after escaping)")
+
+    def __setitem__(self, name, df):
+        self.check_name(name)
+        atomic_replace(self._path(name), lambda f: df.to_pickle(f), binary=True)
+        with self._lock:
+            self._cache.pop(name, None)
+        if self.max_files is not None:
+            self._prune()
+
+    def __getitem__(self, name):
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(name) from None
+        with self._lock:
+            cached = self._cache.get(name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            df = pd.read_pickle(path)
+        except FileNotFoundError:
+            # 読む直前に別のプロセスが消した
+            raise KeyError(name) from None
+        with self._lock:
+            self._cache[name] = (mtime, df)
+        return df
+
+    def __contains__(self, name):
+        return os.path.exists(self._path(name))
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """保存されているシナリオ名（最後に保存した順）"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(_SUFFIX):  # 書き込み中の一時ファイルは .tmp で終わる
+                continue
+            try:
+                entries.append((entry.stat().st_mtime_ns, unquote(entry.name[:-len(_SUFFIX)])))
+            except FileNotFoundError:
+                pass
+        return [name for _, name in sorted(entries)]
+
+    def clear(self):
+        for name in self.keys():
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._cache.clear()
+
+    def _prune(self):
+        """max_files を超えた分を古い順に消す"""
+        names = self.keys()
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._cache.pop(name, None)
+
+    def _path(self, name):
+        # シナリオ名はユーザー入力なので、ファイル名に使えない文字はすべてエスケープする
+        return os.path.join(self.directory, quote(name, safe='') + _SUFFIX)
@@ -0,0 +1,162 @@
+# score_store.py
+#
+# 期間ごとの評価（block_scores）を SQLite（WAL モード）に保存する。
+# (user_name, scenario_name, period) を主キーにして、書き込みは1行ずつの upsert、
+# 読み出しはインデックスを使うクエリになる（TSV 全体の読み直し・書き直しが不要）。
+# 従来の block_scores.tsv は export_tsv() で必要なときに書き出す。
+# 複数のワーカープロセスがそれぞれ接続を持って同じファイルを使える（SQLite のロックで直列化される）。
+# 他のプロセスの書き込みは data_version() の変化で分かる。
+#
+# raw / score は TSV と同じ文字列表現（辞書の str()）のまま保存するので、
+# 書き出した TSV は従来の結果ページ（score 列を JSON として読む）でそのまま読める。
+
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from file_lock import file_lock, atomic_replace
+
+# TSV の列順（Sequential Decision-Making Mode の combine_first による併合後と同じ）
+COLUMNS = ('user_name', 'scenario_name', 'period', 'raw', 'score', 'timestamp', 'total_score')
+KEY = ('user_name', 'scenario_name', 'period')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS block_scores (
+    user_name     TEXT NOT NULL,
+    scenario_name TEXT NOT NULL,
+    period        TEXT NOT NULL,
+    raw           TEXT,
+    score         TEXT,
+    timestamp     TEXT,
+    total_score   REAL,
+    PRIMARY KEY (user_name, scenario_name, period)
+)
+"""
+
+
+def _record_values(user_name, scenario_name, record, timestamp):
+    """aggregate_blocks の1件を COLUMNS 順のタプルにする"""
+    return (
+        user_name,
+        scenario_name,
+        record['period'],
+        None if record.get('raw') is None else str(record['raw']),
+        None if record.get('score') is None else str(record['score']),
+        str(timestamp),
+        None if record.get('total_score') is None else float(record['total_score']),
+    )
+
+
+class ScoreStore:
+    """スレッドセーフな評価ストア（接続は1本を共有し、ロックで直列化する）"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.dirty = True  # 前回の export_tsv() 以降にこのプロセスで変更したか
+        self._exported_version = None  # 前回の export_tsv() 時の data_version()
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        # 他のプロセスが書き込み中のときは待つ（既定の5秒では足りないことがある）
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def upsert_keep_existing(self, user_name, scenario_name, records, timestamp):
+        """
+        Sequential Decision-Making Mode の併合。既存の行は値を残し、空の列だけ新しい値で埋める
+        （従来の old.combine_first(new) と同じ）。
+        """
+        values = [_record_values(user_name, scenario_name, r, timestamp) for r in records]
+        updates = ", ".join(f"{c} = COALESCE(block_scores.{c}, excluded.{c})" for c in COLUMNS if c not in KEY)
+        sql = (
+            f"INSERT INTO block_scores ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+            f"ON CONFLICT ({', '.join(KEY)}) DO UPDATE SET {updates}"
+        )
+        with self._lock, self._conn:
+            self._conn.executemany(sql, values)
+            self.dirty = True
+
+    def replace_user(self, user_name, scenario_name, records, timestamp):
+        """Record Results Mode の保存。そのユーザーの既存の行（全シナリオ）を新しい行で置き換える"""
+        values = [_record_values(user_name, scenario_name, r, timestamp) for r in records]
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM block_scores WHERE user_name = ?", (user_name,))
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO block_scores ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values
+            )
+            self.dirty = True
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM block_scores")
+            self.dirty = True
+
+    def rows(self, user_name=None):
+        """COLUMNS をキーとする辞書のリスト（user_name を指定するとそのユーザーだけ）"""
+        sql = f"SELECT {', '.join(COLUMNS)} FROM block_scores"
+        params = ()
+        if user_name is not None:
+            sql += " WHERE user_name = ?"
+            params = (user_name,)
+        with self._lock:
+            cursor = self._conn.execute(sql + " ORDER BY user_name, scenario_name, period", params)
+            return [dict(zip(COLUMNS, row)) for row in cursor.fetchall()]
+
+    def data_version(self):
+        """他の接続（他のプロセス）がコミットするたびに変わる値。自分の書き込みでは変わらない"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def to_dataframe(self, user_name=None):
+        return pd.DataFrame(self.rows(user_name), columns=list(COLUMNS))
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM block_scores").fetchone()[0]
+
+    def import_tsv(self, path):
+        """
+        既存の block_scores.tsv を取り込む（移行用）。同じキーの行が複数あれば timestamp の新しいほうを使う。
+        取り込んだ行数を返す。
+        """
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        df = pd.read_csv(path, sep='\t')
+        if df.empty or not set(KEY) <= set(df.columns):
+            return 0
+        df = df.reindex(columns=list(COLUMNS))
+        if df['timestamp'].notna().any():
+            df = df.sort_values('timestamp', kind='stable')
+        df = df.drop_duplicates(list(KEY), keep='last')
+        values = [
+            tuple(None if pd.isna(v) else (float(v) if c == 'total_score' else str(v)) for c, v in zip(COLUMNS, row))
+            for row in df.itertuples(index=False)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO block_scores ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                values
+            )
+            self.dirty = True
+        return len(values)
+
+    def export_tsv(self, path, force=False):
+        """block_scores.tsv を書き出す（どのプロセスからも変更がなければ何もしない）。書き出したら True"""
+        with self._export_lock, file_lock(path):
+            version = self.data_version()
+            if not self.dirty and version == self._exported_version and not force and os.path.exists(path):
+                return False
+            # 読み出しより先に記録する（書き出し中の変更は次回の書き出しに含まれる）
+            self.dirty = False
+            self._exported_version = version
+            df = self.to_dataframe()
+            atomic_replace(path, lambda f: df.to_csv(f, sep='\t', index=False))
+            return True
@@ -0,0 +1,300 @@
+# session_store.py
+#
+# Sequential Decision-Making Mode のサーバー側セッション。(user_name, scenario_name) ごとに
+# 最新の SimState とそれまでの軌跡（結果の行）を保持し、クライアントはセッション ID と
+# 意思決定だけを送ればよい（CurrentValues を毎回送って検証し直す必要がない）。
+# 一定時間アクセスのないセッションはメモリから外す。snapshot_dir を指定すると、外す前と
+# snapshot_all() のときにディスクへ保存し、次のアクセスで読み戻す。
+#
+# 複数のワーカープロセスで動かすときは SharedSessionStore を使う。セッションを常にディスクに置き、
+# どのワーカーにリクエストが来ても同じセッションを読み書きできる。
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from file_lock import file_lock, atomic_replace
+from sim_state import SimState
+
+
+class SessionConflict(Exception):
+    """advance() の expected_year がセッションの next_year と一致しない（同じ年の二重送信など）"""
+
+    def __init__(self, next_year, expected_year):
+        super().__init__(f"Session is at year {next_year}, got decisions for {expected_year}")
+        self.next_year = next_year
+        self.expected_year = expected_year
+
+
+@dataclass(slots=True)
+class SequentialSession:
+    session_id: str
+    user_name: str
+    scenario_name: str
+    state: SimState
+    next_year: int                            # 次に計算する年
+    rows: list = field(default_factory=list)  # これまでの結果の行（Python 標準型）
+    last_access: float = 0.0
+
+
+class SessionStore:
+    """スレッドセーフなセッションの置き場所。同じ (user_name, scenario_name) のセッションは1つだけ"""
+
+    def __init__(self, idle_seconds, snapshot_dir=None):
+        self.idle_seconds = float(idle_seconds)
+        self.snapshot_dir = snapshot_dir
+        self._sessions = {}  # session_id → SequentialSession
+        self._by_key = {}    # (user_name, scenario_name) → session_id
+        self._lock = threading.Lock()
+        if snapshot_dir is not None:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    def open(self, user_name, scenario_name, state, next_year):
+        """新しいセッションを作る。同じ (user_name, scenario_name) の既存セッションは破棄する"""
+        session = SequentialSession(
+            session_id=uuid.uuid4().hex,
+            user_name=user_name,
+            scenario_name=scenario_name,
+            state=state,
+            next_year=int(next_year),
+            last_access=time.monotonic(),
+        )
+        with self._lock:
+            self._evict_idle()
+            previous = self._by_key.get((user_name, scenario_name))
+            if previous is not None:
+                self._sessions.pop(previous, None)
+                self._remove_snapshot(previous)
+            self._sessions[session.session_id] = session
+            self._by_key[(user_name, scenario_name)] = session.session_id
+        return session
+
+    def get(self, session_id):
+        """セッションを返す（メモリになければスナップショットから読み戻す）。ないか破棄済みなら None"""
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._load_snapshot(session_id)
+            if session is not None:
+                session.last_access = time.monotonic()
+            return session
+
+    def advance(self, session_id, state, rows, expected_year=None):
+        """
+        計算し終えた年の結果を反映する。rows は新しく計算した年の行（古い順）。
+        expected_year（計算を始めた年）を渡すと、ロックの中で next_year と比べ、違えば SessionConflict
+        （同じ年を並行して計算した2つ目のリクエストは反映しない）。
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if expected_year is not None and session.next_year != expected_year:
+                raise SessionConflict(session.next_year, expected_year)
+            session.state = state
+            session.rows.extend(rows)
+            if rows:
+                session.next_year = int(rows[-1]['Year']) + 1
+            session.last_access = time.monotonic()
+            return session
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None) or self._load_snapshot(session_id, keep=False)
+            if session is not None and self._by_key.get((session.user_name, session.scenario_name)) == session_id:
+                del self._by_key[(session.user_name, session.scenario_name)]
+            self._remove_snapshot(session_id)
+            return session is not None
+
+    def snapshot_all(self):
+        """メモリ上の全セッションをディスクへ保存する（snapshot_dir がなければ何もしない）"""
+        with self._lock:
+            for session in self._sessions.values():
+                self._write_snapshot(session)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'idle_seconds': self.idle_seconds,
+                'snapshot_dir': str(self.snapshot_dir) if self.snapshot_dir is not None else None,
+            }
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - self.idle_seconds
+        for session_id in [sid for sid, s in self._sessions.items() if s.last_access < deadline]:
+            session = self._sessions.pop(session_id)
+            if self.snapshot_dir is None:
+                del self._by_key[(session.user_name, session.scenario_name)]
+            self._write_snapshot(session)
+
+    def _snapshot_path(self, session_id):
+        return os.path.join(self.snapshot_dir, f"{session_id}.pkl")
+
+    def _write_snapshot(self, session):
+        if self.snapshot_dir is None:
+            return
+        atomic_replace(
+            self._snapshot_path(session.session_id),
+            lambda f: pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL),
+            binary=True
+        )
+
+    def _load_snapshot(self, session_id, keep=True):
+        if self.snapshot_dir is None or not session_id.isalnum():
+            return None
+        try:
+            with open(self._snapshot_path(session_id), 'rb') as f:
+                session = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        key = (session.user_name, session.scenario_name)
+        if self._by_key.get(key, session_id) != session_id:
+            # 同じ (user_name, scenario_name) で新しいセッションが開かれている
+            self._remove_snapshot(session_id)
+            return None
+        if keep:
+            self._sessions[session_id] = session
+            self._by_key[key] = session_id
+        return session
+
+    def _remove_snapshot(self, session_id):
+        if self.snapshot_dir is None:
+            return
+        try:
+            os.remove(self._snapshot_path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class SharedSessionStore(SessionStore):
+    """
+    複数プロセスで共有するセッションの置き場所。セッションはメモリに持たず、操作のたびに
+    snapshot_dir のファイルを読み書きする（ディレクトリ単位の file_lock で直列化する）。
+    (user_name, scenario_name) → session_id の対応もファイル（.key）に置く。
+    最後のアクセスはスナップショットの更新時刻で表し、idle_seconds を過ぎたものは open / get のときに消す。
+    """
+
+    def __init__(self, idle_seconds, snapshot_dir):
+        if snapshot_dir is None:
+            raise ValueError("SharedSessionStore requires snapshot_dir")
+        super().__init__(idle_seconds, snapshot_dir)
+        self._dir_lock_path = os.path.join(self.snapshot_dir, 'sessions')
+
+    def open(self, user_name, scenario_name, state, next_year):
+        session = SequentialSession(
+            session_id=uuid.uuid4().hex,
+            user_name=user_name,
+            scenario_name=scenario_name,
+            state=state,
+            next_year=int(next_year),
+            last_access=time.monotonic(),
+        )
+        with self._lock, file_lock(self._dir_lock_path):
+            self._evict_idle()
+            previous = self._read_key(user_name, scenario_name)
+            if previous is not None:
+                self._remove_snapshot(previous)
+            self._write_snapshot(session)
+            atomic_replace(self._key_path(user_name, scenario_name), lambda f: f.write(session.session_id))
+        return session
+
+    def get(self, session_id):
+        with self._lock, file_lock(self._dir_lock_path):
+            self._evict_idle()
+            session = self._load_shared(session_id)
+            if session is not None:
+                # 読むだけのアクセスでも最後のアクセスを更新する
+                os.utime(self._snapshot_path(session_id))
+            return session
+
+    def advance(self, session_id, state, rows, expected_year=None):
+        with self._lock, file_lock(self._dir_lock_path):
+            session = self._load_shared(session_id)
+            if session is None:
+                return None
+            if expected_year is not None and session.next_year != expected_year:
+                raise SessionConflict(session.next_year, expected_year)
+            session.state = state
+            session.rows.extend(rows)
+            if rows:
+                session.next_year = int(rows[-1]['Year']) + 1
+            self._write_snapshot(session)
+            return session
+
+    def close(self, session_id):
+        with self._lock, file_lock(self._dir_lock_path):
+            session = self._load_shared(session_id)
+            if session is None:
+                return False
+            os.remove(self._key_path(session.user_name, session.scenario_name))
+            self._remove_snapshot(session_id)
+            return True
+
+    def snapshot_all(self):
+        """セッションは常にディスクにあるので何もしない"""
+
+    def stats(self):
+        with self._lock:
+            sessions = sum(1 for name in os.listdir(self.snapshot_dir) if name.endswith('.pkl'))
+        return {
+            'sessions': sessions,
+            'idle_seconds': self.idle_seconds,
+            'snapshot_dir': str(self.snapshot_dir),
+            'shared': True,
+        }
+
+    def _evict_idle(self):
+        """更新時刻が idle_seconds より古いスナップショットと、それを指す .key を消す（ディレクトリのロック内で呼ぶ）"""
+        deadline = time.time() - self.idle_seconds
+        evicted = set()
+        for entry in os.scandir(self.snapshot_dir):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                if entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    evicted.add(entry.name[:-len('.pkl')])
+            except FileNotFoundError:
+                pass
+        if not evicted:
+            return
+        for entry in os.scandir(self.snapshot_dir):
+            if not entry.name.endswith('.key'):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    if f.read().strip() in evicted:
+                        os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _load_shared(self, session_id):
+        if not session_id.isalnum():
+            return None
+        try:
+            with open(self._snapshot_path(session_id), 'rb') as f:
+                session = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if self._read_key(session.user_name, session.scenario_name) != session_id:
+            # 同じ (user_name, scenario_name) で新しいセッションが開かれている
+            self._remove_snapshot(session_id)
+            return None
+        return session
+
+    def _key_path(self, user_name, scenario_name):
+        digest = hashlib.sha1(f"{user_name}\0{scenario_name}".encode('utf-8')).hexdigest()
+        return os.path.join(self.snapshot_dir, f"{digest}.key")
+
+    def _read_key(self, user_name, scenario_name):
+        try:
+            with open(self._key_path(user_name, scenario_name), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
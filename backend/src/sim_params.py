@@ -0,0 +1,131 @@
+# sim_params.py
+#
+# シミュレーションのパラメータを不変オブジェクトとして保持する。
+# DEFAULT_PARAMS と rcp_climate_params の組み合わせは起動時に一度だけ作り、
+# リクエスト・ワーカー間で読み取り専用として共有する。
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+
+@dataclass(frozen=True, slots=True)
+class SimParams:
+    start_year: int
+    end_year: int
+    total_years: int
+    years: np.ndarray
+
+    # 地形
+    total_area: float
+    paddy_field_area: float
+
+    # 気温・降水・高温日数
+    base_temp: float
+    temp_trend: float
+    temp_uncertainty: float
+
+    base_precip: float
+    precip_trend: float
+    base_precip_uncertainty: float
+    precip_uncertainty_trend: float
+
+    base_extreme_precip_freq: float
+    extreme_precip_freq_trend: float
+    extreme_precip_intensity_trend: float
+    extreme_precip_uncertainty_trend: float
+    base_mu: float
+    base_beta: float
+
+    initial_hot_days: float
+    temp_to_hot_days_coeff: float
+    hot_days_uncertainty: float
+
+    # 需要（生活用水）
+    initial_municipal_demand: float
+    municipal_demand_trend: float
+    municipal_demand_uncertainty: float
+
+    # 住宅
+    house_total: float
+    cost_per_migration: float
+
+    # 水循環
+    max_available_water: float
+    evapotranspiration_amount: float
+    ecosystem_threshold: float
+
+    # 森林
+    cost_per_1000trees: float
+    forest_degradation_rate: float
+    tree_growup_year: int
+    initial_forest_area: float
+    co2_absorption_per_ha: float
+
+    # 農業
+    temp_coefficient: float
+    max_potential_yield: float
+    optimal_irrigation_amount: float
+    high_temp_tolerance_increment: float
+    necessary_water_for_crops: float
+    paddy_dam_cost_per_ha: float
+    paddy_dam_yield_coef: float
+
+    # 農業R&D
+    RnD_investment_threshold: float
+    RnD_investment_required_years: int
+    temp_threshold_crop_ini: float
+    temp_critical_crop: float
+
+    # 水災害
+    flood_damage_coefficient: float
+    levee_level_increment: float
+    levee_investment_threshold: float
+    levee_investment_required_years: int
+    flood_recovery_cost_coef: float
+    runoff_coef: float
+
+    # 交通
+    transport_level_coef: float
+    distance_urban_level_coef: float
+
+    # 住民意識
+    capacity_building_coefficient: float
+    resident_capacity_degrade_ratio: float
+
+    # 領域横断影響
+    forest_flood_reduction_coef: float
+    forest_ecosystem_boost_coef: float
+    forest_water_retention_coef: float
+    flood_crop_damage_coef: float
+    levee_ecosystem_damage_coef: float
+    flood_urban_damage_coef: float
+    water_ecosystem_coef: float
+    paddy_dam_flood_coef: float
+
+    @classmethod
+    def from_dict(cls, params):
+        """DEFAULT_PARAMS 形式の辞書から作る。知らないキーは無視する"""
+        values = {f.name: params[f.name] for f in fields(cls)}
+        years = np.array(values['years'])
+        years.flags.writeable = False
+        values['years'] = years
+        return cls(**values)
+
+
+def as_sim_params(params):
+    """SimParams ならそのまま、辞書なら SimParams に変換して返す"""
+    return params if isinstance(params, SimParams) else SimParams.from_dict(params)
+
+
+def compile_rcp_params(default_params, rcp_params):
+    """
+    RCP ごとの SimParams を作る。
+
+    Returns:
+        {None: DEFAULT_PARAMS そのもの, rcp値: DEFAULT_PARAMS に rcp_params[rcp値] を反映したもの, ...}
+    """
+    compiled = {None: SimParams.from_dict(default_params)}
+    for rcp, overrides in rcp_params.items():
+        compiled[rcp] = SimParams.from_dict({**default_params, **overrides})
+    return compiled
@@ -0,0 +1,105 @@
+# sim_state.py
+#
+# simulate_year が年ごとに引き継ぐ状態。辞書を毎年作り直す代わりに __slots__ 付きの
+# dataclass を1つ使い回す。各フィールドはスカラー（simulate_year）または
+# シミュレーション軸の配列（simulate_year_batch）。
+# Python 標準型への変換は API のレスポンスを作るとき（main.py）に1回だけ行う。
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from sim_params import as_sim_params
+
+
+def planting_buffer_from_values(values, year, tree_growup_year):
+    """
+    植林履歴の循環バッファ（長さ tree_growup_year、添字は 年 % tree_growup_year）を作る。
+
+    values の 'planting_ring'（直近 tree_growup_year 年分を古い順に並べたリスト、最後が year - 1）
+    を優先し、なければ旧形式の 'planting_history'（年 → 植林量の辞書）から変換する。
+    """
+    L = int(tree_growup_year)
+    buffer = np.zeros(L)
+    if L == 0:
+        return buffer
+    ring = values.get('planting_ring')
+    if ring:
+        recent = np.asarray(ring, dtype=float)[-L:]
+        chronological = np.zeros(L)
+        chronological[L - len(recent):] = recent
+    else:
+        history = values.get('planting_history') or {}
+        chronological = np.array([float(history.get(y, 0)) for y in range(year - L, year)])
+    buffer[np.arange(year - L, year) % L] = chronological
+    return buffer
+
+
+def planting_ring_from_buffer(buffer, next_year):
+    """循環バッファを next_year から再開するための 'planting_ring'（古い順のリスト）に変換する。"""
+    L = len(buffer)
+    return buffer[np.arange(next_year - L, next_year) % L].tolist()
+
+
+@dataclass(slots=True)
+class SimState:
+    temp: float = 0.0
+    precip: float = 0.0
+    municipal_demand: float = 0.0
+    available_water: float = 0.0
+    crop_yield: float = 0.0
+    levee_level: float = 0.0
+    high_temp_tolerance_level: float = 0.0
+    hot_days: float = 0.0
+    extreme_precip_freq: float = 0.0
+    ecosystem_level: float = 100.0
+    urban_level: float = 0.0
+    levee_investment_total: float = 0.0
+    RnD_investment_total: float = 0.0
+    forest_area: float = 0.0
+    paddy_dam_area: float = 0.0
+    resident_capacity: float = 0.0
+    risky_house_total: float = 0.0
+    non_risky_house_total: float = 0.0
+    transportation_level: float = 0.0
+    resident_burden: float = 0.0
+    biodiversity_level: float = 0.0
+    temp_threshold_crop: float = 0.0
+    # 植林の循環バッファ（添字は 年 % tree_growup_year）。バッチでも全シミュレーション共通
+    planting_buffer: np.ndarray = None
+
+    @classmethod
+    def from_values(cls, values, params, year, num_simulations=None):
+        """
+        CurrentValues 形式の辞書から状態を作る。未指定（または None）の項目は simulate_year の初期値。
+
+        num_simulations を指定すると各フィールドを長さ num_simulations の配列にする（バッチ用）。
+        """
+        params = as_sim_params(params)
+        defaults = {
+            'ecosystem_level': 100,
+            'forest_area': params.total_area * params.initial_forest_area,
+            'municipal_demand': params.initial_municipal_demand,
+            'risky_house_total': params.house_total,
+            'temp_threshold_crop': params.temp_threshold_crop_ini,
+        }
+        state = cls()
+        for f in fields(cls):
+            if f.name == 'planting_buffer':
+                continue
+            value = values.get(f.name)
+            if value is None:
+                value = defaults.get(f.name, f.default)
+            if num_simulations is not None:
+                value = np.full(num_simulations, value, dtype=float)
+            setattr(state, f.name, value)
+        state.planting_buffer = planting_buffer_from_values(values, year, params.tree_growup_year)
+        return state
+
+    def copy(self):
+        """独立したコピー（配列・バッファも複製）"""
+        state = SimState()
+        for f in fields(SimState):
+            value = getattr(self, f.name)
+            setattr(state, f.name, value.copy() if isinstance(value, np.ndarray) else value)
+        return state
@@ -2,25 +2,54 @@
 
 import numpy as np
 import pandas as pd
-from scipy.stats import gumbel_r
-
-def simulate_year(year, prev_values, decision_vars, params):
-    # --- 前年の値を展開（初期値を定義していない変数は追って調整） ---
-    prev_levee_level = prev_values.get('levee_level', 0.0)
-    high_temp_tolerance_level = prev_values.get('high_temp_tolerance_level', 0.0)
-    ecosystem_level = prev_values.get('ecosystem_level', 100)
-    prev_forest_area = prev_values.get('forest_area', params['total_area'] * params['initial_forest_area']) ##################
-    planting_history    = prev_values.get('planting_history', {}) ##################
-    resident_capacity = prev_values.get('resident_capacity', 0.0) ##################
-    transportation_level = prev_values.get('transportation_level', 0.0) ##################
-    prev_municipal_demand = prev_values.get('municipal_demand', params['initial_municipal_demand'])##################
-    prev_available_water = prev_values.get('available_water', 0.0)
-    levee_investment_total = prev_values.get('levee_investment_total', 0.0)
-    RnD_investment_total = prev_values.get('RnD_investment_total', 0.0)
-    risky_house_total = prev_values.get('risky_house_total', params['house_total'])
-    non_risky_house_total = prev_values.get('non_risky_house_total', 0)
-    paddy_dam_area = prev_values.get('paddy_dam_area', 0)
-    temp_threshold_crop = prev_values.get('temp_threshold_crop', params['temp_threshold_crop_ini'])
+
+from climate_forcing import build_climate_forcing, forcing_at
+from sim_state import SimState, planting_ring_from_buffer
+from sim_params import as_sim_params
+
+class SimulationCancelled(Exception):
+    """cancel() により年ループの途中で打ち切られた"""
+
+
+def spawn_rngs(seed, num_simulations, start=0):
+    """
+    シミュレーションごとに独立した乱数ストリームを生成する。
+
+    i 番目のストリームは SeedSequence(seed).spawn(n)[i] と同一なので、
+    同じ seed であれば逐次実行・プロセスプール・バッチのどれでも同じ乱数列になる。
+    """
+    return [
+        np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(i,)))
+        for i in range(start, start + num_simulations)
+    ]
+
+
+def simulate_year(year, state, decision_vars, params, forcing=None, rng=None):
+    # state: 前年の状態（SimState）。この関数が上書きして返す。辞書を渡した場合は SimState に変換する
+    # params: SimParams（辞書を渡した場合は変換する）
+    # forcing: その年・そのシミュレーションの確率的入力（climate_forcing.forcing_at）。
+    # 省略時はこの年の分だけ生成する
+    params = as_sim_params(params)
+    if not isinstance(state, SimState):
+        state = SimState.from_values(state, params, year)
+    if forcing is None:
+        forcing = forcing_at(build_climate_forcing([year], params, 1, None if rng is None else [rng]), 0)
+
+    # --- 前年の値を展開 ---
+    prev_levee_level = state.levee_level
+    high_temp_tolerance_level = state.high_temp_tolerance_level
+    prev_forest_area = state.forest_area
+    planting_buffer = state.planting_buffer # 植林の循環バッファ（年 % tree_growup_year）
+    resident_capacity = state.resident_capacity
+    transportation_level = state.transportation_level
+    prev_municipal_demand = state.municipal_demand
+    prev_available_water = state.available_water
+    levee_investment_total = state.levee_investment_total
+    RnD_investment_total = state.RnD_investment_total
+    risky_house_total = state.risky_house_total
+    non_risky_house_total = state.non_risky_house_total
+    paddy_dam_area = state.paddy_dam_area
+    temp_threshold_crop = state.temp_threshold_crop
 
     # --- 意思決定変数を展開 ---
     # モンテカルロモードでは mapping された internal keys が来る前提
@@ -33,116 +62,111 @@ def simulate_year(year, prev_values, decision_vars, params):
     transportation_invest        = decision_vars.get('transportation_invest', 0)
 
     # --- パラメータを展開 ---
-    start_year                    = params['start_year']
+    start_year                    = params.start_year
     # 年平均気温
-    base_temp                     = params['base_temp']
-    temp_trend                    = params['temp_trend']
-    temp_uncertainty              = params['temp_uncertainty']
+    base_temp                     = params.base_temp
+    temp_trend                    = params.temp_trend
+    temp_uncertainty              = params.temp_uncertainty
     # 年降水量
-    base_precip                   = params['base_precip']
-    precip_trend                  = params['precip_trend']
-    base_precip_uncertainty       = params['base_precip_uncertainty']
-    precip_uncertainty_trend      = params['precip_uncertainty_trend']
+    base_precip                   = params.base_precip
+    precip_trend                  = params.precip_trend
+    base_precip_uncertainty       = params.base_precip_uncertainty
+    precip_uncertainty_trend      = params.precip_uncertainty_trend
     # 高温
-    initial_hot_days              = params['initial_hot_days'] # hot_daysは今後の利用可能性を含め残す（熱中症など）
-    temp_to_hot_days_coeff        = params['temp_to_hot_days_coeff']
-    hot_days_uncertainty          = params['hot_days_uncertainty']
+    initial_hot_days              = params.initial_hot_days # hot_daysは今後の利用可能性を含め残す（熱中症など）
+    temp_to_hot_days_coeff        = params.temp_to_hot_days_coeff
+    hot_days_uncertainty          = params.hot_days_uncertainty
     # 極端降水
-    base_extreme_precip_freq      = params['base_extreme_precip_freq']
-    extreme_precip_freq_trend     = params['extreme_precip_freq_trend']
-    extreme_precip_intensity_trend= params['extreme_precip_intensity_trend']
-    extreme_precip_uncertainty_trend=params['extreme_precip_uncertainty_trend']
-    base_mu = params['base_mu']
-    base_beta = params['base_beta']
+    base_extreme_precip_freq      = params.base_extreme_precip_freq
+    extreme_precip_freq_trend     = params.extreme_precip_freq_trend
+    extreme_precip_intensity_trend= params.extreme_precip_intensity_trend
+    extreme_precip_uncertainty_trend=params.extreme_precip_uncertainty_trend
+    base_mu = params.base_mu
+    base_beta = params.base_beta
     # 水需要
-    municipal_demand_trend        = params['municipal_demand_trend']
-    municipal_demand_uncertainty  = params['municipal_demand_uncertainty']
+    municipal_demand_trend        = params.municipal_demand_trend
+    municipal_demand_uncertainty  = params.municipal_demand_uncertainty
     # 水循環
-    max_available_water           = params['max_available_water']
-    evapotranspiration_amount     = params['evapotranspiration_amount']
-    ecosystem_threshold           = params['ecosystem_threshold']
+    max_available_water           = params.max_available_water
+    evapotranspiration_amount     = params.evapotranspiration_amount
+    ecosystem_threshold           = params.ecosystem_threshold
     # 農業
-    temp_coefficient              = params['temp_coefficient']
-    max_potential_yield           = params['max_potential_yield']
-    optimal_irrigation_amount     = params['optimal_irrigation_amount']
-    high_temp_tolerance_increment = params['high_temp_tolerance_increment']
-    necessary_water_for_crops = params['necessary_water_for_crops']
-    paddy_dam_cost_per_ha = params['paddy_dam_cost_per_ha']
-    paddy_dam_yield_coef = params['paddy_dam_yield_coef']
-    temp_critical_crop = params['temp_critical_crop']
+    temp_coefficient              = params.temp_coefficient
+    max_potential_yield           = params.max_potential_yield
+    optimal_irrigation_amount     = params.optimal_irrigation_amount
+    high_temp_tolerance_increment = params.high_temp_tolerance_increment
+    necessary_water_for_crops = params.necessary_water_for_crops
+    paddy_dam_cost_per_ha = params.paddy_dam_cost_per_ha
+    paddy_dam_yield_coef = params.paddy_dam_yield_coef
+    temp_critical_crop = params.temp_critical_crop
     # 水災害
-    flood_damage_coefficient      = params['flood_damage_coefficient']
-    levee_level_increment         = params['levee_level_increment']
-    levee_investment_threshold    = params['levee_investment_threshold']
-    RnD_investment_threshold      = params['RnD_investment_threshold']
-    levee_investment_required_years = params['levee_investment_required_years']
-    RnD_investment_required_years = params['RnD_investment_required_years']
-    flood_recovery_cost_coef = params['flood_recovery_cost_coef']
-    runoff_coef = params['runoff_coef']
+    flood_damage_coefficient      = params.flood_damage_coefficient
+    levee_level_increment         = params.levee_level_increment
+    levee_investment_threshold    = params.levee_investment_threshold
+    RnD_investment_threshold      = params.RnD_investment_threshold
+    levee_investment_required_years = params.levee_investment_required_years
+    RnD_investment_required_years = params.RnD_investment_required_years
+    flood_recovery_cost_coef = params.flood_recovery_cost_coef
+    runoff_coef = params.runoff_coef
     # 森林
-    cost_per_1000trees = params['cost_per_1000trees']
-    forest_degradation_rate = params['forest_degradation_rate']
-    tree_growup_year = params['tree_growup_year']
-    co2_absorption_per_ha = params['co2_absorption_per_ha']
+    cost_per_1000trees = params.cost_per_1000trees
+    forest_degradation_rate = params.forest_degradation_rate
+    tree_growup_year = params.tree_growup_year
+    co2_absorption_per_ha = params.co2_absorption_per_ha
     # 住宅
-    cost_per_migration = params['cost_per_migration']
+    cost_per_migration = params.cost_per_migration
     # 住民意識
-    capacity_building_coefficient = params['capacity_building_coefficient']
-    resident_capacity_degrade_ratio = params['resident_capacity_degrade_ratio']
+    capacity_building_coefficient = params.capacity_building_coefficient
+    resident_capacity_degrade_ratio = params.resident_capacity_degrade_ratio
     # 交通
-    transport_level_coef = params['transport_level_coef']
-    distance_urban_level_coef = params['distance_urban_level_coef']
+    transport_level_coef = params.transport_level_coef
+    distance_urban_level_coef = params.distance_urban_level_coef
     # 領域横断影響
-    forest_flood_reduction_coef = params['forest_flood_reduction_coef'] ### 0.4-2.8 [%/%]
-    forest_water_retention_coef = params['forest_water_retention_coef'] ### 2-4 [mm/%]
-    forest_flood_reduction_coef = np.random.uniform(0.4,2.8)
-    forest_water_retention_coef = np.random.uniform(2,4)
-    # forest_ecosystem_boost_coef = params['forest_ecosystem_boost_coef'] 
-    flood_crop_damage_coef = params['flood_crop_damage_coef']
-    levee_ecosystem_damage_coef = params['levee_ecosystem_damage_coef']
-    flood_urban_damage_coef = params['flood_urban_damage_coef']
-    water_ecosystem_coef = params['water_ecosystem_coef']
-    paddy_dam_flood_coef = params['paddy_dam_flood_coef']
+    forest_flood_reduction_coef = params.forest_flood_reduction_coef ### 0.4-2.8 [%/%]
+    forest_water_retention_coef = params.forest_water_retention_coef ### 2-4 [mm/%]
+    forest_flood_reduction_coef = forcing['forest_flood_reduction_coef']
+    forest_water_retention_coef = forcing['forest_water_retention_coef']
+    # forest_ecosystem_boost_coef = params.forest_ecosystem_boost_coef 
+    flood_crop_damage_coef = params.flood_crop_damage_coef
+    levee_ecosystem_damage_coef = params.levee_ecosystem_damage_coef
+    flood_urban_damage_coef = params.flood_urban_damage_coef
+    water_ecosystem_coef = params.water_ecosystem_coef
+    paddy_dam_flood_coef = params.paddy_dam_flood_coef
     # 地形
-    total_area = params['total_area']
-    paddy_field_area = params['paddy_field_area']
+    total_area = params.total_area
+    paddy_field_area = params.paddy_field_area
     
     # resident_density = 1000 # [person/km^2]
     # water_demand_per_resident = 130 # [m3/person]
     # current_municipal_demand = water_water_demand_per_resident * resident_density / 1000 = 130 [mm]
 
     # ---------------------------------------------------------
-    # 1. 気象環境 ---
-    temp = base_temp + temp_trend * (year - start_year) + np.random.normal(0, temp_uncertainty)
-
-    precip_unc = base_precip_uncertainty + precip_uncertainty_trend * (year - start_year)
-    precip = max(0, base_precip + precip_trend * (year - start_year) + np.random.normal(0, precip_unc))
-    
-    hot_days = initial_hot_days + (temp - base_temp) * temp_to_hot_days_coeff + np.random.normal(0, hot_days_uncertainty)
-    hot_days = max(hot_days, 0)
-    
-    extreme_precip_freq = max(base_extreme_precip_freq + extreme_precip_freq_trend * (year - start_year), 0)
-    extreme_precip_events = np.random.poisson(extreme_precip_freq)
-    
-    mu = max(base_mu + extreme_precip_intensity_trend * (year - start_year), 0)
-    beta = max(base_beta + extreme_precip_intensity_trend * (year - start_year), 0) 
-    
-    rain_events = gumbel_r.rvs(loc=mu, scale=beta, size=extreme_precip_events)
+    # 1. 気象環境 --- climate_forcing で事前計算済み
+    temp = forcing['temp']
+    precip = forcing['precip']
+    hot_days = forcing['hot_days']
+    extreme_precip_freq = forcing['extreme_precip_freq']
+    extreme_precip_events = forcing['extreme_precip_events']
+    rain_events = forcing['rain_events']
 
     # ---------------------------------------------------------
     # 2. 社会環境（水需要） ---
-    municipal_growth = municipal_demand_trend + np.random.normal(0, municipal_demand_uncertainty)
+    municipal_growth = forcing['municipal_growth']
     current_municipal_demand = prev_municipal_demand * (1 + municipal_growth)
  
      # ---------------------------------------------------------
     # 3. 森林面積（植林 - 自然減衰） ---
-    planting_history[year] = planting_trees_amount # assume 1000 trees = 1ha
-    matured_trees = planting_history.get(year - tree_growup_year, 0)
+    # assume 1000 trees = 1ha。tree_growup_year 年前の植林はこの年の枠に入っているので、読んでから上書きする
+    if tree_growup_year > 0:
+        matured_trees = planting_buffer[year % tree_growup_year]
+        planting_buffer[year % tree_growup_year] = planting_trees_amount
+    else:
+        matured_trees = planting_trees_amount
     natural_loss = prev_forest_area * forest_degradation_rate
     current_forest_area = max(prev_forest_area + matured_trees - natural_loss, 0)
 
     # #forest_area の効果発現 ---
-    flood_reduction = forest_flood_reduction_coef * ((current_forest_area - total_area * params['initial_forest_area']) / total_area)
+    flood_reduction = forest_flood_reduction_coef * ((current_forest_area - total_area * params.initial_forest_area) / total_area)
     water_retention_boost = forest_water_retention_coef * current_forest_area / total_area # 水源涵養効果
     co2_absorbed = current_forest_area * co2_absorption_per_ha  # tCO2
 
@@ -174,7 +198,7 @@ def simulate_year(year, prev_values, decision_vars, params):
 
     # 5.2 農業R&D：累積投資で耐熱性向上（確率的閾値）
     RnD_investment_total += agricultural_RnD_cost
-    RnD_threshold_with_noise = np.random.normal(RnD_investment_threshold * RnD_investment_required_years, RnD_investment_threshold * 0.1)
+    RnD_threshold_with_noise = forcing['RnD_threshold_with_noise']
 
     if RnD_investment_total >= RnD_threshold_with_noise:
         high_temp_tolerance_level += high_temp_tolerance_increment
@@ -190,7 +214,7 @@ def simulate_year(year, prev_values, decision_vars, params):
     # ---------------------------------------------------------
     # 7.1 堤防：累積投資で建設（確率的閾値）
     levee_investment_total += dam_levee_construction_cost
-    levee_threshold_with_noise = np.random.normal(levee_investment_threshold * levee_investment_required_years, levee_investment_threshold * 0.1)
+    levee_threshold_with_noise = forcing['levee_threshold_with_noise']
 
     if levee_investment_total >= levee_threshold_with_noise:
         current_levee_level = prev_levee_level + levee_level_increment
@@ -231,7 +255,7 @@ def simulate_year(year, prev_values, decision_vars, params):
 
     # Weighted ecosystem score
     # w1, w2, w3 = 1/3, 1/3, 1/3
-    weights = np.random.dirichlet([1, 1, 1])
+    weights = forcing['ecosystem_weights']
     w1, w2, w3 = weights
 
     ecosystem_level = (w1 * ecological_base + w2 * disturbance_resistance + w3 * human_pressure) * 100
@@ -286,7 +310,7 @@ def simulate_year(year, prev_values, decision_vars, params):
         'RnD investment total': RnD_investment_total,
         'Resident capacity': resident_capacity,
         'Forest Area': current_forest_area,
-        'planting_history': planting_history,
+        'planting_ring': planting_ring_from_buffer(planting_buffer, year + 1),
         'risky_house_total': risky_house_total,
         'non_risky_house_total': non_risky_house_total,
         'transportation_level' : transportation_level,
@@ -302,67 +326,122 @@ def simulate_year(year, prev_values, decision_vars, params):
         'transportation_invest': transportation_invest,
     }
 
-    current_values = {
-        'temp': temp,
-        'precip': precip,
-        'municipal_demand': current_municipal_demand,
-        'available_water': current_available_water,
-        'crop_yield': current_crop_yield,
-        'levee_level': current_levee_level,
-        'high_temp_tolerance_level': high_temp_tolerance_level,
-        'hot_days': hot_days,
-        'extreme_precip_freq': extreme_precip_freq,
-        'ecosystem_level': ecosystem_level,
-        'urban_level': urban_level,
-        'levee_investment_total': levee_investment_total,
-        'RnD_investment_total': RnD_investment_total,
-        'forest_area': current_forest_area,
-        'paddy_dam_area' : paddy_dam_area,
-        'resident_capacity': resident_capacity,
-        'planting_history': planting_history,
-        'risky_house_total': risky_house_total,
-        'non_risky_house_total': non_risky_house_total,
-        'transportation_level' : transportation_level,
-        'resident_burden': resident_burden,
-        'biodiversity_level': ecosystem_level,
-    }
-
-    # 辞書の中のNumPy型をすべてPython標準型に変換する関数を追加
-    def convert_numpy(obj):
-        if isinstance(obj, dict):
-            return {convert_numpy(k): convert_numpy(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_numpy(i) for i in obj]
-        elif isinstance(obj, (np.integer, np.int64)):
-            return int(obj)
-        elif isinstance(obj, (np.floating, np.float64)):
-            return float(obj)
-        else:
-            return obj
-
-    outputs = convert_numpy(outputs)
-    current_values = convert_numpy(current_values)
-
-    return current_values, outputs
-
-
-def simulate_simulation(years, initial_values, decision_vars_list, params):
-    prev_values = initial_values.copy()
+    state.temp = temp
+    state.precip = precip
+    state.municipal_demand = current_municipal_demand
+    state.available_water = current_available_water
+    state.crop_yield = current_crop_yield
+    state.levee_level = current_levee_level
+    state.high_temp_tolerance_level = high_temp_tolerance_level
+    state.hot_days = hot_days
+    state.extreme_precip_freq = extreme_precip_freq
+    state.ecosystem_level = ecosystem_level
+    state.urban_level = urban_level
+    state.levee_investment_total = levee_investment_total
+    state.RnD_investment_total = RnD_investment_total
+    state.forest_area = current_forest_area
+    state.paddy_dam_area = paddy_dam_area
+    state.resident_capacity = resident_capacity
+    state.risky_house_total = risky_house_total
+    state.non_risky_house_total = non_risky_house_total
+    state.transportation_level = transportation_level
+    state.resident_burden = resident_burden
+    state.biodiversity_level = ecosystem_level
+
+    # outputs には NumPy のスカラーが含まれうる。Python 標準型への変換はレスポンス作成時に行う
+    return state, outputs
+
+
+# DecisionVar の7つの施策（compile_decision_schedule の列順）
+DECISION_KEYS = (
+    'planting_trees_amount',
+    'house_migration_amount',
+    'dam_levee_construction_cost',
+    'paddy_dam_construction_cost',
+    'capacity_building_cost',
+    'agricultural_RnD_cost',
+    'transportation_invest',
+)
+
+
+def compile_decision_schedule(decision_vars_list, years, params):
+    """
+    意思決定変数を実行ごとに1回だけ years × len(DECISION_KEYS) の float 配列に変換する。
+
+    各年に使う行の決め方:
+        ndarray     → コンパイル済みとしてそのまま返す
+        リスト      → 最後の要素（全年共通）
+        DataFrame   → 先頭行（全年共通）
+        それ以外    → 10年ごとの .loc[開始年 + 経過年 // 10 * 10]
+    未指定の施策は 0。
+    """
+    years = np.asarray(years)
+    if isinstance(decision_vars_list, np.ndarray):
+        # コンパイル済み（プロセスプールへ渡す場合など）
+        return decision_vars_list
+    if isinstance(decision_vars_list, list):
+        rows = [decision_vars_list[len(decision_vars_list)-1]] if len(years) else []
+        year_rows = np.zeros(len(years), dtype=int)
+    elif isinstance(decision_vars_list, pd.DataFrame):
+        rows = decision_vars_list.head(1).to_dict(orient='records') if len(years) else []
+        year_rows = np.zeros(len(years), dtype=int)
+    else:
+        decision_years = (years - params.start_year) // 10 * 10 + params.start_year
+        unique_years, year_rows = np.unique(decision_years, return_inverse=True)
+        rows = [decision_vars_list.loc[y].to_dict() for y in unique_years]
+    table = np.array([[row.get(key, 0) for key in DECISION_KEYS] for row in rows], dtype=float)
+    return table.reshape(-1, len(DECISION_KEYS))[year_rows]
+
+
+def simulate_simulation(years, initial_values, decision_vars_list, params, rng=None, forcing=None, sim_index=0, out=None,
+                        cancel=None):
+    # forcing を渡すと（build_climate_forcing の戻り値）その sim_index 列を使う。
+    # 同じ forcing で意思決定だけを変えた比較ができる
+    # out（result_block.allocate_result_block）を渡すと、年ごとの辞書のリストの代わりに
+    # out の sim_index 行へ書き込んで out を返す
+    # cancel（引数なしの関数）を渡すと毎年確認し、True なら SimulationCancelled を送出する
+    params = as_sim_params(params)
+    out_index = sim_index
+    if forcing is None:
+        forcing = build_climate_forcing(years, params, 1, None if rng is None else [rng])
+        sim_index = 0
+
+    state = SimState.from_values(initial_values, params, int(years[0])) if len(years) else None
+    schedule = [dict(zip(DECISION_KEYS, row)) for row in compile_decision_schedule(decision_vars_list, years, params).tolist()]
     results = []
 
     for idx, year in enumerate(years):
-        # 意思決定変数の取得
-        if isinstance(decision_vars_list, list):
-            # 意思決定変数の取得
-            decision_vars = decision_vars_list[len(decision_vars_list)-1]
-        elif isinstance(decision_vars_list, pd.DataFrame):
-            decision_vars = decision_vars_list.to_dict(orient='records')[0]
+        if cancel is not None and cancel():
+            raise SimulationCancelled()
+        state, outputs = simulate_year(year, state, schedule[idx], params, forcing_at(forcing, idx, sim_index))
+        if out is not None:
+            out.write_year(idx, outputs, out_index)
         else:
-            decision_year = (year - params['start_year']) // 10 * 10 + params['start_year']
-            decision_vars_raw = decision_vars_list.loc[decision_year].to_dict()
-            decision_vars = decision_vars_raw
+            results.append(outputs)
+
+    return out if out is not None else results
+
+def iter_sequential_years(start_year, num_years, initial_values, decision_vars_list, params, seed=None, cancel=None,
+                          state=None):
+    """
+    Sequential Decision-Making Mode を start_year から num_years 年分続けて進め、1年ごとに outputs を返す。
+
+    状態（SimState）は年をまたいでそのまま引き継ぐ。state を渡すと initial_values の代わりに
+    それを上書きしながら進める（セッションの続きから計算する場合）。シード付きの乱数は1年ずつ呼ぶ場合と同じく
+    年ごとに spawn_rngs([seed, 年], 1) のストリームを使う。params.end_year より後の年は計算しない。
+    """
+    params = as_sim_params(params)
+    years = np.arange(start_year, min(start_year + num_years, params.end_year + 1))
+    if not len(years):
+        return
+    if state is None:
+        state = SimState.from_values(initial_values, params, int(years[0]))
+    schedule = compile_decision_schedule(decision_vars_list, years, params)
 
-        prev_values, outputs = simulate_year(year, prev_values, decision_vars, params)
-        results.append(outputs)
-
-    return results
\ No newline at end of file
+    for idx, year in enumerate(years):
+        if cancel is not None and cancel():
+            raise SimulationCancelled()
+        rngs = spawn_rngs([seed, int(year)], 1) if seed is not None else None
+        forcing = forcing_at(build_climate_forcing([year], params, 1, rngs), 0)
+        state, outputs = simulate_year(year, state, dict(zip(DECISION_KEYS, schedule[idx].tolist())), params, forcing)
+        yield outputs
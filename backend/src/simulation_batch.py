@@ -0,0 +1,279 @@
+# simulation_batch.py
+#
+# simulate_year と同じモデルを N 本のシミュレーションに対して同時に 1 年ずつ進める。
+# 状態変数はシミュレーション軸を持つ NumPy 配列（shape = (N,)）として保持する。
+
+import numpy as np
+import pandas as pd
+
+from simulation import DECISION_KEYS, SimulationCancelled, compile_decision_schedule
+from sim_state import SimState, planting_ring_from_buffer
+from sim_params import as_sim_params
+from climate_forcing import build_climate_forcing, forcing_slice
+
+def simulate_year_batch(year, state, decision_vars, params, forcing):
+    """simulate_year のベクトル化版。state の配列を更新し、その年の出力列を返す
+
+    forcing はその年の全シミュレーション分（climate_forcing.forcing_slice）。
+    """
+    n = len(forcing['temp'])
+
+    planting_trees_amount        = decision_vars.get('planting_trees_amount', 0)
+    house_migration_amount       = decision_vars.get('house_migration_amount', 0)
+    dam_levee_construction_cost  = decision_vars.get('dam_levee_construction_cost', 0)
+    paddy_dam_construction_cost  = decision_vars.get('paddy_dam_construction_cost', 0)
+    capacity_building_cost       = decision_vars.get('capacity_building_cost', 0)
+    agricultural_RnD_cost        = decision_vars.get('agricultural_RnD_cost', 0)
+    transportation_invest        = decision_vars.get('transportation_invest', 0)
+
+    base_temp = params.base_temp
+    total_area = params.total_area
+    paddy_field_area = params.paddy_field_area
+    necessary_water_for_crops = params.necessary_water_for_crops
+
+    forest_flood_reduction_coef = forcing['forest_flood_reduction_coef']
+    forest_water_retention_coef = forcing['forest_water_retention_coef']
+
+    # ---------------------------------------------------------
+    # 1. 気象環境 ---
+    temp = forcing['temp']
+    precip = forcing['precip']
+    hot_days = forcing['hot_days']
+    extreme_precip_freq = forcing['extreme_precip_freq']
+    extreme_precip_events = forcing['extreme_precip_events']
+    rain_event_values = forcing['rain_event_values']
+    rain_event_offsets = forcing['rain_event_offsets']
+
+    # ---------------------------------------------------------
+    # 2. 社会環境（水需要） ---
+    municipal_growth = forcing['municipal_growth']
+    current_municipal_demand = state.municipal_demand * (1 + municipal_growth)
+
+    # ---------------------------------------------------------
+    # 3. 森林面積（植林 - 自然減衰） --- 植林履歴は全シミュレーション共通
+    tree_growup_year = params.tree_growup_year
+    planting_buffer = state.planting_buffer
+    if tree_growup_year > 0:
+        matured_trees = planting_buffer[year % tree_growup_year]
+        planting_buffer[year % tree_growup_year] = planting_trees_amount
+    else:
+        matured_trees = planting_trees_amount
+    natural_loss = state.forest_area * params.forest_degradation_rate
+    current_forest_area = np.maximum(state.forest_area + matured_trees - natural_loss, 0)
+
+    flood_reduction = forest_flood_reduction_coef * ((current_forest_area - total_area * params.initial_forest_area) / total_area)
+    water_retention_boost = forest_water_retention_coef * current_forest_area / total_area
+
+    # ---------------------------------------------------------
+    # 4. 利用可能水量
+    evapotranspiration_amount = params.evapotranspiration_amount * (1 + (temp - base_temp) * 0.05)
+    current_available_water = np.minimum(
+        np.maximum(
+            state.available_water + precip - evapotranspiration_amount - current_municipal_demand
+            - params.runoff_coef * precip + water_retention_boost * precip,
+            0
+        ),
+        params.max_available_water
+    )
+
+    # ---------------------------------------------------------
+    # 5. 農業生産量
+    high_temp_tolerance_level = state.high_temp_tolerance_level
+    temp_threshold_crop = state.temp_threshold_crop
+    temp_ripening = temp + 10.0
+    excess = np.maximum(temp_ripening - (temp_threshold_crop + high_temp_tolerance_level), 0)
+    loss = excess / (params.temp_critical_crop - temp_threshold_crop)
+    temp_impact = np.minimum(loss, 1)
+    paddy_dam_area = state.paddy_dam_area + paddy_dam_construction_cost / params.paddy_dam_cost_per_ha
+    paddy_dam_yield_impact = params.paddy_dam_yield_coef * np.minimum(paddy_dam_area / paddy_field_area, 1)
+
+    water_impact = np.minimum(current_available_water / necessary_water_for_crops, 1.0)
+    current_crop_yield = np.maximum(
+        (params.max_potential_yield * (1 - temp_impact)) * water_impact * (1 - paddy_dam_yield_impact), 0
+    )
+
+    current_available_water = np.maximum(current_available_water - necessary_water_for_crops, 0)
+
+    # 5.2 農業R&D
+    RnD_investment_total = state.RnD_investment_total + agricultural_RnD_cost
+    RnD_threshold_with_noise = forcing['RnD_threshold_with_noise']
+    RnD_done = RnD_investment_total >= RnD_threshold_with_noise
+    high_temp_tolerance_level = np.where(RnD_done, high_temp_tolerance_level + params.high_temp_tolerance_increment, high_temp_tolerance_level)
+    RnD_investment_total = np.where(RnD_done, 0.0, RnD_investment_total)
+
+    # ---------------------------------------------------------
+    # 6. 住宅の移転
+    total_house = state.risky_house_total + state.non_risky_house_total
+    risky_house_total = np.maximum(state.risky_house_total - house_migration_amount + total_house * municipal_growth, 0)
+    non_risky_house_total = state.non_risky_house_total + house_migration_amount
+    migration_ratio = non_risky_house_total / total_house
+
+    # ---------------------------------------------------------
+    # 7.1 堤防
+    levee_investment_total = state.levee_investment_total + dam_levee_construction_cost
+    levee_threshold_with_noise = forcing['levee_threshold_with_noise']
+    levee_done = levee_investment_total >= levee_threshold_with_noise
+    current_levee_level = np.where(levee_done, state.levee_level + params.levee_level_increment, state.levee_level)
+    levee_investment_total = np.where(levee_done, levee_investment_total - levee_threshold_with_noise, levee_investment_total)
+
+    # 7.2 水害
+    # simulate_year のループは flood_impact を毎回上書きするため、被害額は最後の事象で決まる
+    resident_capacity = state.resident_capacity
+    paddy_dam_level = params.paddy_dam_flood_coef * np.minimum(paddy_dam_area / paddy_field_area, 1)
+    has_event = extreme_precip_events > 0
+    last_rain = np.zeros(n)
+    last_rain[has_event] = rain_event_values[rain_event_offsets[1:][has_event] - 1]
+    overflow_amount = np.maximum(last_rain - current_levee_level - paddy_dam_level, 0) * (1 - flood_reduction)
+    flood_impact = overflow_amount * params.flood_damage_coefficient
+    response_factor = 1 / (1 + np.exp(-0.1 * (overflow_amount - 400)))
+    effective_protection = (1 - resident_capacity * (1 - response_factor)) * (1 - migration_ratio * (1 - response_factor))
+    flood_impact = np.where(has_event, flood_impact + flood_impact * effective_protection, 0.0)
+
+    current_flood_damage = np.maximum(flood_impact, 0.0)
+    current_crop_yield = current_crop_yield - current_flood_damage * params.flood_crop_damage_coef
+
+    # ---------------------------------------------------------
+    # 8. 損害・生態系の評価
+    ecological_base = 0.5 * np.minimum(current_forest_area / total_area, 1.0) \
+        + 0.5 * np.minimum(current_available_water / params.ecosystem_threshold, 1.0)
+    temp_diff = np.abs(temp - base_temp)
+    disturbance_resistance = np.maximum(0, 1.0 - 0.05 * temp_diff - 0.03 * extreme_precip_events)
+    human_pressure = 1.0 - np.minimum(0.01 * current_levee_level, 1.0)
+
+    weights = forcing['ecosystem_weights']
+    ecosystem_level = (weights[:, 0] * ecological_base + weights[:, 1] * disturbance_resistance + weights[:, 2] * human_pressure) * 100
+
+    # ---------------------------------------------------------
+    # 9. 都市の居住可能性の評価
+    transportation_level = state.transportation_level * 0.95 + params.transport_level_coef * transportation_invest - 0.01
+    urban_level = params.distance_urban_level_coef * (1 - migration_ratio) * transportation_level
+    urban_level = urban_level - current_flood_damage * params.flood_urban_damage_coef
+    urban_level = np.minimum(np.maximum(urban_level, 0), 100)
+
+    # ---------------------------------------------------------
+    # 10. 住民の防災能力・意識
+    resident_capacity = np.minimum(0.99, np.maximum(
+        0.0,
+        resident_capacity * (1 - params.resident_capacity_degrade_ratio) + capacity_building_cost * params.capacity_building_coefficient
+    ))
+
+    # ---------------------------------------------------------
+    # 11. コスト・住民負担算出
+    planting_trees_cost = planting_trees_amount * params.cost_per_1000trees
+    migration_cost = house_migration_amount * params.cost_per_migration
+    municipal_cost = dam_levee_construction_cost * 100_000_000 \
+                   + agricultural_RnD_cost * 10_000_000 \
+                   + paddy_dam_construction_cost * 1_000_000 \
+                   + capacity_building_cost * 1_000_000 \
+                   + planting_trees_cost \
+                   + migration_cost \
+                   + transportation_invest * 10_000_000
+    resident_burden = municipal_cost / total_house
+    resident_burden = resident_burden + current_flood_damage * params.flood_recovery_cost_coef / total_house
+
+    state.temp = temp
+    state.precip = precip
+    state.municipal_demand = current_municipal_demand
+    state.available_water = current_available_water
+    state.crop_yield = current_crop_yield
+    state.hot_days = hot_days
+    state.extreme_precip_freq = extreme_precip_freq
+    state.ecosystem_level = ecosystem_level
+    state.urban_level = urban_level
+    state.resident_burden = resident_burden
+    state.biodiversity_level = ecosystem_level
+    state.levee_level = current_levee_level
+    state.high_temp_tolerance_level = high_temp_tolerance_level
+    state.levee_investment_total = levee_investment_total
+    state.RnD_investment_total = RnD_investment_total
+    state.forest_area = current_forest_area
+    state.paddy_dam_area = paddy_dam_area
+    state.resident_capacity = resident_capacity
+    state.risky_house_total = risky_house_total
+    state.non_risky_house_total = non_risky_house_total
+    state.transportation_level = transportation_level
+
+    # simulate_year の outputs と同じ列名・順序
+    return {
+        'Year': year,
+        'Temperature (℃)': temp,
+        'Precipitation (mm)': precip,
+        'Available Water': current_available_water,
+        'Crop Yield': current_crop_yield,
+        'Municipal Demand': current_municipal_demand,
+        'Flood Damage': current_flood_damage,
+        'Levee Level': current_levee_level,
+        'High Temp Tolerance Level': high_temp_tolerance_level,
+        'Hot Days': hot_days,
+        'Extreme Precip Frequency': extreme_precip_freq,
+        'Extreme Precip Events': extreme_precip_events,
+        'Ecosystem Level': ecosystem_level,
+        'Municipal Cost': municipal_cost,
+        'Urban Level': urban_level,
+        'Resident Burden': resident_burden,
+        'Levee investment total': levee_investment_total,
+        'RnD investment total': RnD_investment_total,
+        'Resident capacity': resident_capacity,
+        'Forest Area': current_forest_area,
+        'planting_ring': planting_ring_from_buffer(planting_buffer, year + 1),
+        'risky_house_total': risky_house_total,
+        'non_risky_house_total': non_risky_house_total,
+        'transportation_level': transportation_level,
+        'paddy_dam_area': paddy_dam_area,
+        'planting_trees_amount': planting_trees_amount,
+        'house_migration_amount': house_migration_amount,
+        'dam_levee_construction_cost': dam_levee_construction_cost,
+        'paddy_dam_construction_cost': paddy_dam_construction_cost,
+        'capacity_building_cost': capacity_building_cost,
+        'agricultural_RnD_cost': agricultural_RnD_cost,
+        'transportation_invest': transportation_invest,
+    }
+
+
+def simulate_simulation_batch(years, initial_values, decision_vars_list, params, num_simulations, rng=None, forcing=None, out=None,
+                              cancel=None):
+    """
+    N 本のモンテカルロシミュレーションをまとめて実行する。
+
+    戻り値は simulate_simulation の結果を Simulation 列付きで連結したものと同じ形の DataFrame
+    （Simulation 昇順、各シミュレーション内は Year 昇順）。
+    rng に spawn_rngs(seed, N) を渡すと、同じ seed の simulate_simulation と同一の結果になる。
+    forcing（build_climate_forcing の戻り値）を渡すと乱数は引かずにそれを使う。
+    out（result_block.allocate_result_block(N, years)）を渡すと DataFrame は作らずに
+    各年の出力を out に書き込んで out を返す。
+    cancel（引数なしの関数）を渡すと毎年確認し、True なら SimulationCancelled を送出する。
+    """
+    n = int(num_simulations)
+    params = as_sim_params(params)
+    if forcing is None:
+        forcing = build_climate_forcing(years, params, n, rng)
+    state = SimState.from_values(initial_values, params, int(years[0]), num_simulations=n) if len(years) else None
+
+    schedule = compile_decision_schedule(decision_vars_list, years, params)
+
+    yearly = []
+    for t, year in enumerate(years):
+        if cancel is not None and cancel():
+            raise SimulationCancelled()
+        decision_vars = dict(zip(DECISION_KEYS, schedule[t].tolist()))
+        outputs = simulate_year_batch(year, state, decision_vars, params, forcing_slice(forcing, t))
+        if out is not None:
+            out.write_year(t, outputs)
+        else:
+            yearly.append(outputs)
+    if out is not None:
+        return out
+
+    num_years = len(yearly)
+    columns = {}
+    for key in (yearly[0] if yearly else {}):
+        if key == 'planting_ring':
+            # 年ごとのスナップショット（全シミュレーションで共通）
+            snapshots = [row[key] for row in yearly]
+            columns[key] = [snapshots[t] for _ in range(n) for t in range(num_years)]
+            continue
+        stacked = np.stack([np.broadcast_to(row[key], (n,)) for row in yearly])  # (years, sims)
+        columns[key] = stacked.T.reshape(-1)
+    columns['Simulation'] = np.repeat(np.arange(n), num_years)
+
+    return pd.DataFrame(columns)
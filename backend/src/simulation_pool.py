@@ -0,0 +1,198 @@
+# simulation_pool.py
+#
+# モンテカルロ用のプロセスプール。アプリ起動時（main.py の lifespan）に一度だけ作り、全リクエストで共有する。
+# ワーカーは起動時に numpy / pandas / シミュレーションのカーネルを import 済みにしておき、
+# シミュレーションは1本ずつではなくチャンク単位で投げ、結果は共有メモリ経由で受け取る。
+
+import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+_pool = None
+_pool_workers = 0
+
+
+def _init_worker():
+    # 最初のタスクで import 待ちが発生しないよう、ワーカー起動時に読み込んでおく
+    import pandas  # noqa: F401
+    import simulation  # noqa: F401
+    import simulation_batch  # noqa: F401
+    import result_block  # noqa: F401
+
+
+def _ready():
+    return True
+
+
+def start_pool(max_workers):
+    """プールを作り、全ワーカーの起動（と import）が終わるまで待つ"""
+    global _pool, _pool_workers
+    if _pool is None:
+        # 共有メモリの登録をワーカーと同じ resource_tracker で管理するため、先に起動しておく
+        resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+        _pool_workers = max_workers
+        for future in [_pool.submit(_ready) for _ in range(max_workers)]:
+            future.result()
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool, _pool_workers = None, 0
+
+
+def get_pool(max_workers):
+    """起動済みのプール。lifespan を通らない場合（テストクライアントなど）はここで作る"""
+    return _pool if _pool is not None else start_pool(max_workers)
+
+
+def chunk_ranges(num_simulations, num_workers, chunks_per_worker=2, start=0):
+    """[start, start + num_simulations) を (start, count) のチャンクに分ける"""
+    size = max(1, math.ceil(num_simulations / (max(1, num_workers) * chunks_per_worker)))
+    stop = start + num_simulations
+    return [(first, min(size, stop - first)) for first in range(start, stop, size)]
+
+
+def simulate_chunk(years, initial_values, schedule, params, seed, start, count, shm_name, shape, offset=0):
+    """
+    start 番目から count 本のシミュレーションを実行し、共有メモリの結果バッファに直接書き込む（ワーカー側）。
+
+    schedule は compile_decision_schedule の結果、seed は spawn_rngs の seed。
+    各シミュレーションは spawn_rngs(seed, count, start) のストリームを使うため、
+    チャンクの切り方によらず同じ seed なら同じ結果になる。
+    shm_name / shape は親が確保した (fields, sims, years) の float64 バッファで、
+    その sims 軸の 0 番目がシミュレーション番号 offset に当たる。
+
+    Returns:
+        (start, count)。結果そのものはプロセス間で送らない
+    """
+    from result_block import ResultBlock
+    from simulation import simulate_simulation, spawn_rngs
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    data = chunk = None
+    try:
+        data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        chunk = ResultBlock(years=years, data=data[:, start - offset:start - offset + count])
+        for i, rng in enumerate(spawn_rngs(seed, count, start)):
+            simulate_simulation(years, initial_values, schedule, params, rng=rng, sim_index=i, out=chunk)
+    finally:
+        # バッファを参照する配列を先に手放さないと close できない
+        data = chunk = None
+        shm.close()
+    return start, count
+
+
+def iter_monte_carlo(years, initial_values, decision_vars_list, params, num_simulations, seed=None,
+                     max_workers=1, engine="scalar", chunks_per_worker=2, wave_size=None):
+    """
+    num_simulations 本をチャンクに分けて実行し、終わったチャンクから順に ResultBlock（start 付き）を返す。
+
+    engine="scalar" はプールのワーカーが共有メモリへ直接書き込み、完了したチャンクの分だけ
+    親プロセスの配列へコピーする。共有メモリはジェネレータの終了時（途中で閉じられた場合も）に解放する。
+    engine="batch" はこのプロセス内で simulate_simulation_batch をチャンクごとに実行する。
+    wave_size を指定すると wave_size 本ずつ順に実行し、同時に確保する結果バッファをその分に抑える。
+    seed が None の場合はリクエストごとに新しいエントロピーを使う
+    （ワーカー間・リクエスト間で乱数列が重ならないように）。
+    どちらの engine でも、同じ seed ならチャンク・ウェーブの切り方によらず同じ結果になる。
+    """
+    return _iter_monte_carlo(years, initial_values, decision_vars_list, params, num_simulations, seed,
+                             max_workers, engine, chunks_per_worker, wave_size)
+
+
+def _iter_monte_carlo(years, initial_values, decision_vars_list, params, num_simulations, seed,
+                      max_workers, engine, chunks_per_worker, wave_size, out=None):
+    """
+    iter_monte_carlo の本体。out（num_simulations 本分の ResultBlock）を渡すと結果を out に直接書き込み、
+    返すチャンクは out のビューになる（チャンクごとのコピーをしない）
+    """
+    from simulation import compile_decision_schedule
+
+    years = np.asarray(years)
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    schedule = compile_decision_schedule(decision_vars_list, years, params)
+    wave_size = int(num_simulations) if wave_size is None else max(1, int(wave_size))
+
+    for wave_start in range(0, int(num_simulations), wave_size):
+        wave_count = min(wave_size, int(num_simulations) - wave_start)
+        if engine == "batch":
+            chunks = chunk_ranges(wave_count, max_workers, chunks_per_worker, wave_start)
+            yield from _iter_batch_chunks(years, initial_values, schedule, params, seed, chunks, out)
+        else:
+            pool = get_pool(max_workers)
+            chunks = chunk_ranges(wave_count, _pool_workers, chunks_per_worker, wave_start)
+            yield from _iter_pool_chunks(pool, years, initial_values, schedule, params, seed, chunks, out)
+
+
+def _iter_batch_chunks(years, initial_values, schedule, params, seed, chunks, out=None):
+    from result_block import ResultBlock, allocate_result_block
+    from simulation import spawn_rngs
+    from simulation_batch import simulate_simulation_batch
+
+    for start, count in chunks:
+        if out is None:
+            dest = allocate_result_block(count, years)
+        else:
+            dest = ResultBlock(years=years, data=out.data[:, start:start + count])
+        chunk = simulate_simulation_batch(
+            years, initial_values, schedule, params, count,
+            rng=spawn_rngs(seed, count, start), out=dest
+        )
+        chunk.start = start
+        yield chunk
+
+
+def _iter_pool_chunks(pool, years, initial_values, schedule, params, seed, chunks, out=None):
+    """
+    out が None なら完了したチャンクの分だけ共有メモリからコピーして返す（unlink 後も使えるように）。
+    out を渡すと全チャンクの完了を待ってからウェーブ全体を out へ一度だけコピーし、out のビューを返す
+    """
+    from result_block import OUTPUT_FIELDS, ResultBlock
+
+    # 共有メモリはこのウェーブの分だけ確保する（ワーカーにはウェーブ内のオフセットを渡す）
+    first = chunks[0][0]
+    total = sum(count for _, count in chunks)
+    shape = (len(OUTPUT_FIELDS), total, len(years))
+    shm = shared_memory.SharedMemory(create=True, size=max(1, math.prod(shape) * np.dtype(np.float64).itemsize))
+    futures = []
+    try:
+        for start, count in chunks:
+            futures.append(pool.submit(
+                simulate_chunk, years, initial_values, schedule, params, seed, start, count, shm.name, shape, first
+            ))
+        if out is not None:
+            for future in as_completed(futures):
+                future.result()
+            out.data[:, first:first + total] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            for start, count in chunks:
+                yield ResultBlock(years=years, data=out.data[:, start:start + count], start=start)
+            return
+        for future in as_completed(futures):
+            start, count = future.result()
+            offset = start - first
+            data = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)[:, offset:offset + count].copy()
+            yield ResultBlock(years=years, data=data, start=start)
+    finally:
+        # 実行中のチャンクが残っていても unlink してよい（アタッチ済みのマッピングは有効なまま）
+        for future in futures:
+            future.cancel()
+        shm.close()
+        shm.unlink()
+
+
+def run_monte_carlo(years, initial_values, decision_vars_list, params, num_simulations, seed=None,
+                    max_workers=1, engine="scalar"):
+    """iter_monte_carlo と同じ結果を1つの ResultBlock にまとめて返す（各チャンクは block に直接書き込む）"""
+    from result_block import allocate_result_block
+
+    block = allocate_result_block(num_simulations, years)
+    for _ in _iter_monte_carlo(years, initial_values, decision_vars_list, params, num_simulations, seed,
+                               max_workers, engine, 2, None, out=block):
+        pass
+    return block
@@ -32,6 +32,17 @@ def calculate_scenario_indicators(df: pd.DataFrame) -> dict:
         '都市利便性': df['Urban Level'].mean(),
     }
 
+# 各指標の元になる列と、期間内の集計方法（_raw_values の順序）
+RAW_METRICS = {
+    '収量': ('Crop Yield', 'sum'),
+    '洪水被害': ('Flood Damage', 'sum'),
+    '予算': ('Municipal Cost', 'sum'),
+    '住民負担': ('Resident Burden', 'sum'),
+    '生態系': ('Ecosystem Level', 'mean'),
+    '森林面積': ('Forest Area', 'mean'),
+    '都市利便性': ('Urban Level', 'mean'),
+}
+
 def aggregate_blocks(df: pd.DataFrame) -> list[dict]:
     records = []
     for s, e, label in BLOCKS:
@@ -44,25 +55,44 @@ def aggregate_blocks(df: pd.DataFrame) -> list[dict]:
         records.append(dict(period=label, raw=raw, score=score, total_score=total))
     return records
 
+def block_total_scores(columns: dict, years) -> dict:
+    """
+    aggregate_blocks の total_score を全シミュレーション分まとめて計算する。
+
+    columns は 列名 → (sims, years) の配列（ResultBlock.columns()）。
+    戻り値は 期間ラベル → (sims,) の total_score（データのない期間は含まない）。
+    """
+    years = np.asarray(years)
+    totals = {}
+    for s, e, label in BLOCKS:
+        mask = (years >= s) & (years <= e)
+        if not mask.any():
+            continue
+        scores = []
+        for metric, (column, how) in RAW_METRICS.items():
+            values = np.asarray(columns[column])[:, mask]
+            raw = values.sum(axis=1) if how == 'sum' else values.mean(axis=1)
+            scores.append(_scale_to_100_array(raw, metric))
+        totals[label] = np.mean(scores, axis=0)
+    return totals
+
 def _scale_to_100(raw_val: float, metric: str) -> float:
+    return float(_scale_to_100_array(raw_val, metric))
+
+def _scale_to_100_array(raw_val, metric: str):
     b = BENCHMARK[metric]
     v = np.clip(raw_val, b['worst'], b['best']) if b['worst'] < b['best'] else np.clip(raw_val, b['best'], b['worst'])
     if b['invert']:
         score = 100 * (b['worst'] - v) / (b['worst'] - b['best'])
     else:
         score = 100 * (v - b['worst']) / (b['best'] - b['worst'])
-    return float(np.round(score, 1))
+    return np.round(score, 1)
 
 def _raw_values(df: pd.DataFrame, start: int, end: int) -> dict:
     mask = (df['Year'] >= start) & (df['Year'] <= end)
     return {
-        '収量': df.loc[mask, 'Crop Yield'].sum(),
-        '洪水被害': df.loc[mask, 'Flood Damage'].sum(),
-        '予算': df.loc[mask, 'Municipal Cost'].sum(),
-        '住民負担': df.loc[mask, 'Resident Burden'].sum(),
-        '生態系': df.loc[mask, 'Ecosystem Level'].mean(),
-        '森林面積': df.loc[mask, 'Forest Area'].mean(),
-        '都市利便性': df.loc[mask, 'Urban Level'].mean(),
+        metric: df.loc[mask, column].sum() if how == 'sum' else df.loc[mask, column].mean()
+        for metric, (column, how) in RAW_METRICS.items()
     }
 
 
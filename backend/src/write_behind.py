@@ -0,0 +1,151 @@
+# write_behind.py
+#
+# 永続化の書き込みをリクエストの外へ出すキュー。書き込み先（キー）ごとに保留中の項目をため、
+# 件数が max_batch に達するか flush_interval 秒たつと、バックグラウンドのスレッドが
+# キーごとに1回の書き込み（sink）でまとめて書き出す。close() で残りをすべて書き出す。
+#
+# 読み出す側は、読む前に flush(key) を呼べば自分の書き込みを必ず読める。
+
+import os
+import threading
+
+import pandas as pd
+
+from file_lock import file_lock
+
+FSYNC_POLICIES = ('none', 'batch', 'always')
+
+
+def append_text_sink(path, fsync='none'):
+    """
+    テキストの追記先。項目（文字列）をまとめて1回で追記する。
+
+    fsync: 'none'（OS に任せる）/ 'batch'（まとめて書いた後に1回）/ 'always'（項目ごと）
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy: {fsync}")
+
+    def write(items):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with file_lock(path), open(path, 'a', encoding='utf-8') as f:
+            if fsync == 'always':
+                for item in items:
+                    f.write(item)
+                    f.flush()
+                    os.fsync(f.fileno())
+                return
+            f.write(''.join(items))
+            f.flush()
+            if fsync == 'batch':
+                os.fsync(f.fileno())
+
+    return write
+
+
+def csv_log_sink(log, fsync='none'):
+    """
+    append_log.AppendOnlyCsvLog の追記先。項目（DataFrame）を連結して1回で追記する。
+
+    fsync は append_text_sink と同じ。'always' では項目ごとに追記して fsync する。
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"Unknown fsync policy: {fsync}")
+
+    def write(frames):
+        if fsync == 'always':
+            for frame in frames:
+                log.append(frame, fsync=True)
+            return
+        log.append(pd.concat(frames, ignore_index=True), fsync=fsync == 'batch')
+
+    return write
+
+
+class WriteBehindQueue:
+    """キーごとに sink(items) を登録し、put(key, item) でためた項目をまとめて書き出す"""
+
+    def __init__(self, flush_interval, max_batch, on_error=None):
+        self.flush_interval = float(flush_interval)
+        self.max_batch = max(1, int(max_batch))
+        self.on_error = on_error
+        self._sinks = {}        # key → sink(items)
+        self._pending = {}      # key → 保留中の項目のリスト
+        self._flush_locks = {}  # key → Lock（同じキーのまとまりを順番どおりに書く）
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self.flushed_batches = 0
+        self.flushed_items = 0
+
+    def register(self, key, sink):
+        with self._cond:
+            self._sinks[key] = sink
+            self._pending.setdefault(key, [])
+            self._flush_locks.setdefault(key, threading.Lock())
+
+    def put(self, key, item):
+        """項目をためる。スレッドが動いていない（開始前・close 後）ときはその場で書き出す"""
+        with self._cond:
+            self._pending[key].append(item)
+            running = self._thread is not None and not self._closed
+            if running and len(self._pending[key]) >= self.max_batch:
+                self._cond.notify()
+        if not running:
+            self.flush(key)
+
+    def flush(self, key=None):
+        """key（None なら全キー）の保留中の項目を書き出す"""
+        for k in ([key] if key is not None else list(self._sinks)):
+            with self._flush_locks[k]:
+                with self._cond:
+                    items = self._pending[k]
+                    self._pending[k] = []
+                if not items:
+                    continue
+                try:
+                    self._sinks[k](items)
+                    self.flushed_batches += 1
+                    self.flushed_items += len(items)
+                except Exception as e:
+                    if self.on_error is None:
+                        raise
+                    self.on_error(k, e)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """スレッドを止め、残りをすべて書き出す"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': {str(k): len(v) for k, v in self._pending.items()},
+                'flushed_batches': self.flushed_batches,
+                'flushed_items': self.flushed_items,
+                'flush_interval': self.flush_interval,
+                'max_batch': self.max_batch,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or any(len(v) >= self.max_batch for v in self._pending.values()),
+                    timeout=self.flush_interval
+                )
+                if self._closed:
+                    return
+            self.flush()
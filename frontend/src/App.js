@@ -408,6 +408,8 @@ function App() {
 
   // ここでuseRefを定義
   const wsLogRef = useRef(null);
+  // 予測リクエスト用の乱数シード（セッション中は固定し、同じ入力の予測はバックエンドの結果キャッシュを使う）
+  const predictSeedRef = useRef(Math.floor(Math.random() * 2 ** 31));
   const [logQueue, setLogQueue] = useState([]); // 前端log缓存队列
   const [logStatus, setLogStatus] = useState('disconnected'); // WebSocket连接状态
 
@@ -645,39 +647,60 @@ function App() {
   }, []);
 
   // (A) シミュレーション実行ハンドラ
-  const handleSimulate = async () => {
+  // 複数年分の Sequential シミュレーションを1回のリクエストで実行する（1年ごとに NDJSON で結果が届く）
+  const handleSimulateYears = async (numYears) => {
     setLoading(true);
     setError("");
     if (!userName || userName.trim() === "") {
       alert("お名前を入力してください");
       setOpenNameDialog(true);
+      setLoading(false);
       return;
     }
     try {
-      // /simulate に POST するパラメータ
-      console.log("現在の入力:", decisionVarRef.current, currentValuesRef.current)
-      console.log("RCP value being sent:", decisionVarRef.current.cp_climate_params)
-      
       const body = {
         scenario_name: scenarioName,
         user_name: userName,
-        mode: "Sequential Decision-Making Mode",  // "Monte Carlo Simulation Mode" または "Sequential Decision-Making Mode"
+        mode: "Sequential Decision-Making Mode",
         decision_vars: [decisionVarRef.current],
         num_simulations: Number(numSimulations),
+        num_years: numYears,
         current_year_index_seq: currentValuesRef.current
       };
 
-      // axios でリクエスト
-      const resp = await axios.post(`${BACKEND_URL}/simulate`, body);
-      console.log("API Response:", resp.data.data[0]);
-      // resp.data はバックエンドの SimulationResponse (scenario_name, data)
-      if (resp.data && resp.data.data) {
-        const processedData = processIndicatorData(resp.data.data, selectedIndicator);
-        setSimulationData(prev => [...prev, ...processedData]);
-        updateCurrentValues(resp.data.data[0])
+      const resp = await fetch(`${BACKEND_URL}/simulate/sequential`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body)
+      });
+      if (!resp.ok) {
+        throw new Error(`HTTP ${resp.status}`);
+      }
+
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const message = JSON.parse(line);
+          if (message.done) continue;
+          // 1年分の結果を反映し、次の年へ進める
+          const processedData = processIndicatorData([message.row], selectedIndicator);
+          setSimulationData(prev => [...prev, ...processedData]);
+          updateCurrentValues(message.row);
+          updateDecisionVar("year", message.year + 1);
+          // 表示更新のために一時停止（見た目をスムーズに）
+          await new Promise(res => setTimeout(res, LINE_CHART_DISPLAY_INTERVAL));
+        }
       }
     } catch (err) {
-      console.error('API エラー:', error.response.data);
+      console.error('API エラー:', err);
       setError("シミュレーションに失敗しました");
     } finally {
       setLoading(false);
@@ -696,8 +719,6 @@ function App() {
     if (isRunningRef.current) return;
     isRunningRef.current = true;
 
-    let nextYear = decisionVar.year;
-    let count = 0;
     let cycleStartYear = decisionVar.year; // サイクル開始年を記録
     let latestSimulationData = []; // 最新のシミュレーションデータを保存
 
@@ -712,21 +733,8 @@ function App() {
     setInputHistory(prev => [...prev, currentInput]);
     setInputCount(prev => prev + 1);
 
-    while (count < SIMULATION_YEARS) {
-
-      // シミュレーション実行
-      await handleSimulate();
-
-      // 次へ
-      count += 1;
-      nextYear += 1;
-
-      // 現在の年を更新
-      updateDecisionVar("year", nextYear);
-
-      // 表示更新のために一時停止（見た目をスムーズに）
-      await new Promise(res => setTimeout(res, LINE_CHART_DISPLAY_INTERVAL));
-    }
+    // SIMULATION_YEARS 年分を1回のリクエストで計算し、1年ごとに届く行でグラフを更新する
+    await handleSimulateYears(SIMULATION_YEARS);
 
     isRunningRef.current = false;
     
@@ -759,90 +767,56 @@ function App() {
       console.log("現在の入力:", decisionVarRef.current, currentValuesRef.current)
 
       if (chartPredictMode === 'best-worst') {
-        // モード（１）：ベストケース、ワーストケースの２つを計算
-        // 上限予測値の計算
-        let upperDecisionVar = { ...decisionVarRef.current };
-        upperDecisionVar['cp_climate_params'] = 8.5
-
-        const upperBody = {
+        // モード（１）：ベストケース（RCP1.9）、ワーストケース（RCP8.5）を1回のリクエストでまとめて計算
+        const ensembleBody = {
           user_name: userName,
           scenario_name: scenarioName,
-          mode: "Predict Simulation Mode",
-          decision_vars: [upperDecisionVar],
-          num_simulations: Number(numSimulations),
-          current_year_index_seq: currentValuesRef.current
+          decision_vars: [{ ...decisionVarRef.current }],
+          current_year_index_seq: currentValuesRef.current,
+          ensemble_size: 1,
+          seed: predictSeedRef.current,
+          rcp_values: [1.9, 8.5]
         };
 
-        // axios でリクエスト
-        const upresp = await axios.post(`${BACKEND_URL}/simulate`, upperBody);
-        if (upresp.data && upresp.data.data) {
-          setChartPredictData((prev) => {
-            const updated = [...prev];
-            updated[1] = upresp.data.data;
-            return updated;
-          });
+        const resp = await axios.post(`${BACKEND_URL}/simulate/predict_ensemble`, ensembleBody);
+        if (resp.data && resp.data.ensembles) {
+          // [0]: 下限予測値（RCP1.9）、[1]: 上限予測値（RCP8.5）
+          setChartPredictData(resp.data.ensembles.map((ensemble) => ensemble.trajectories[0]));
         }
-
-        // 下限予測値の計算
-        let lowerDecisionVar = { ...decisionVarRef.current };
-        lowerDecisionVar['cp_climate_params'] = 1.9
-
-        const lowerBody = {
+      } else if (chartPredictMode === 'monte-carlo') {
+        // モード（２）：１０回のモンテカルロシミュレーションを1回のリクエストでまとめて計算
+        const ensembleBody = {
           user_name: userName,
           scenario_name: scenarioName,
-          mode: "Predict Simulation Mode",
-          decision_vars: [lowerDecisionVar],
-          num_simulations: Number(numSimulations),
-          current_year_index_seq: currentValuesRef.current
+          decision_vars: [{ ...decisionVarRef.current }],
+          current_year_index_seq: currentValuesRef.current,
+          ensemble_size: 10,
+          seed: predictSeedRef.current,
+          rcp_values: [decisionVarRef.current.cp_climate_params]
         };
 
-        // axios でリクエスト
-        const resp = await axios.post(`${BACKEND_URL}/simulate`, lowerBody);
-        setBlockScores(prev => [...prev, ...resp.data.block_scores]);
-        if (resp.data && resp.data.data) {
-          setChartPredictData((prev) => {
-            const updated = [...prev];
-            updated[0] = resp.data.data;
-            return updated;
-          });
-        }
-      } else if (chartPredictMode === 'monte-carlo') {
-        // モード（２）：１０回のモンテカルロシミュレーション
-        const monteCarloResults = [];
-        
-        for (let i = 0; i < 10; i++) {
-          let monteCarloDecisionVar = { ...decisionVarRef.current };
-          monteCarloDecisionVar['cp_climate_params'] = decisionVarRef.current.cp_climate_params;
-
-          const monteCarloBody = {
-            user_name: userName,
-            scenario_name: scenarioName,
-            mode: "Predict Simulation Mode",
-            decision_vars: [monteCarloDecisionVar],
-            num_simulations: Number(numSimulations),
-            current_year_index_seq: currentValuesRef.current
-          };
-
-          try {
-            const resp = await axios.post(`${BACKEND_URL}/simulate`, monteCarloBody);
-            if (resp.data && resp.data.data) {
-              monteCarloResults.push(resp.data.data);
-            }
-          } catch (error) {
-            console.error(`モンテカルロシミュレーション ${i + 1} 回目でエラー:`, error);
+        try {
+          const resp = await axios.post(`${BACKEND_URL}/simulate/predict_ensemble`, ensembleBody);
+          const monteCarloResults = resp.data && resp.data.ensembles ? resp.data.ensembles[0].trajectories : [];
+          // モンテカルロ結果をchartPredictDataに設定
+          if (monteCarloResults.length > 0) {
+            setChartPredictData(monteCarloResults);
+          }
+        } catch (error) {
+          // 409: より新しい予測リクエストに置き換えられた（結果は新しい方で更新される）
+          if (!(error.response && error.response.status === 409)) {
+            console.error("モンテカルロシミュレーションでエラー:", error);
           }
-        }
-
-        // モンテカルロ結果をchartPredictDataに設定
-        if (monteCarloResults.length > 0) {
-          setChartPredictData(monteCarloResults);
         }
       } else if (chartPredictMode === 'none') {
         // モード（３）：予測結果を表示しない
         setChartPredictData([[], []]);
       }
     } catch (error) {
-      console.error("API取得エラー:", error);
+      // 409: より新しい予測リクエストに置き換えられた
+      if (!(error.response && error.response.status === 409)) {
+        console.error("API取得エラー:", error);
+      }
     }
   };
 